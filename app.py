@@ -1,16 +1,28 @@
-from flask import Flask, request
+from flask import Flask, request, make_response
 from neo4jInterface import *
 from flask_cors import CORS
 import json
-import requests  # Add this import for the new endpoint
+import itertools
+import numpy as np
 from rapidfuzz import process, fuzz
-from rapidfuzz.process import extract, extractOne, cdist
 from apscheduler.schedulers.background import BackgroundScheduler
-from collections import defaultdict
+from nameIndex import NameSnapshot, snapshot_paths
+from lruCache import LRUCache
+from searchTracker import SearchTracker
+from ratingCoalescer import RatingCoalescer
+from embedCache import EmbedError, EmbedFetcher
+from photoUploads import PhotoUploader, UploadTooLarge, read_limited
+from werkzeug.exceptions import RequestEntityTooLarge
 from supabase import create_client, Client
 import os
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 import uuid
+import base64
+import hashlib
+import re
 
 app = Flask(__name__)
 CORS(app)
@@ -19,7 +31,96 @@ CORS(app)
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
-connector = PersonConnector(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+# Shortest-path result cache size, and seconds before a cached path is recomputed
+PATH_CACHE_SIZE = int(os.getenv("PATH_CACHE_SIZE", "4096"))
+PATH_CACHE_TTL = float(os.getenv("PATH_CACHE_TTL", "300"))
+# "memory" answers /api/getPath from an in-process copy of the graph, reloaded
+# whenever the graph version changes; "neo4j" runs every path query in the database
+PATH_ENGINE = os.getenv("PATH_ENGINE", "neo4j")
+# Answer "no path" straight away for people in different connected components
+PATH_COMPONENT_CHECK = os.getenv("PATH_COMPONENT_CHECK", "true").lower() == "true"
+# Parsed relationship assets kept in memory, and whether the projected asset
+# fields are read from relationship properties (run migrations.py asset-properties first)
+ASSET_CACHE_SIZE = int(os.getenv("ASSET_CACHE_SIZE", "8192"))
+ASSET_PROPERTIES = os.getenv("ASSET_PROPERTIES", "false").lower() == "true"
+# "pairwise" stores an IN_PICTURE_WITH relationship per pair of people in a photo,
+# "photo" stores one Photo node per photo (see `python migrations.py photos`)
+GRAPH_STORAGE_MODEL = os.getenv("GRAPH_STORAGE_MODEL", "pairwise")
+# Database name, connection pool size, seconds to wait for a pooled connection,
+# per-transaction timeout (unset for the server default) and how long transient
+# errors are retried
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "100"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60"))
+NEO4J_QUERY_TIMEOUT = float(os.getenv("NEO4J_QUERY_TIMEOUT")) if os.getenv("NEO4J_QUERY_TIMEOUT") else None
+NEO4J_MAX_RETRY_TIME = float(os.getenv("NEO4J_MAX_RETRY_TIME", "30"))
+connector = PersonConnector(
+    NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD,
+    path_cache_size=PATH_CACHE_SIZE,
+    path_cache_ttl=PATH_CACHE_TTL,
+    path_engine=PATH_ENGINE,
+    component_check=PATH_COMPONENT_CHECK,
+    asset_cache_size=ASSET_CACHE_SIZE,
+    asset_properties=ASSET_PROPERTIES,
+    storage_model=GRAPH_STORAGE_MODEL,
+    database=NEO4J_DATABASE,
+    max_pool_size=NEO4J_MAX_POOL_SIZE,
+    acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+    query_timeout=NEO4J_QUERY_TIMEOUT,
+    max_retry_time=NEO4J_MAX_RETRY_TIME
+)
+
+# Rows per page of /api/getContributions and /api/getReports when the request
+# gives no limit, and the largest limit a request may ask for. The default of 0
+# returns every row, for dashboards that do not follow nextCursor yet; it is to
+# become a bounded page size once they do
+MODERATION_PAGE_SIZE = int(os.getenv("MODERATION_PAGE_SIZE", "0"))
+MODERATION_MAX_PAGE_SIZE = int(os.getenv("MODERATION_MAX_PAGE_SIZE", "1000"))
+# Column names the moderation endpoints accept in ?fields=
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Most items a bulk moderation request accepts, and contributions or reports
+# applied to Neo4j per transaction
+MAX_MODERATION_BATCH = int(os.getenv("MAX_MODERATION_BATCH", "1000"))
+MODERATION_WRITE_BATCH = int(os.getenv("MODERATION_WRITE_BATCH", "100"))
+
+# Rating changes are summed per relationship and written every RATING_FLUSH_MS
+# milliseconds or RATING_FLUSH_EVENTS changes. RATING_DURABILITY is "group"
+# (answer once written), "async" (answer at once with an optimistic total) or
+# "direct" (one write per change, no buffering)
+RATING_FLUSH_MS = int(os.getenv("RATING_FLUSH_MS", "100"))
+RATING_FLUSH_EVENTS = int(os.getenv("RATING_FLUSH_EVENTS", "500"))
+RATING_DURABILITY = os.getenv("RATING_DURABILITY", "group")
+RATING_FLUSH_ON_SHUTDOWN = os.getenv("RATING_FLUSH_ON_SHUTDOWN", "true").lower() == "true"
+rating_coalescer = RatingCoalescer(
+    connector.update_relationship_ratings,
+    flush_interval=RATING_FLUSH_MS / 1000,
+    max_events=RATING_FLUSH_EVENTS,
+    durability=RATING_DURABILITY,
+    flush_on_shutdown=RATING_FLUSH_ON_SHUTDOWN
+)
+
+# iframely embed lookups: in-memory cache size, seconds before an embed is fetched
+# again, optional SQLite file that keeps embeds across restarts, and HTTP timeout
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))
+EMBED_STORE_PATH = os.getenv("EMBED_STORE_PATH")
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "10"))
+embed_fetcher = EmbedFetcher(
+    api_url=os.getenv("IFRAMELY_URL", "https://iframely.com/api/try"),
+    cache_size=EMBED_CACHE_SIZE,
+    ttl=EMBED_CACHE_TTL,
+    store_path=EMBED_STORE_PATH,
+    timeout=(3.05, EMBED_TIMEOUT)
+)
+# /api/getPath?embed=true fetches the embeds of a path on EMBED_WORKERS threads and
+# answers after at most EMBED_DEADLINE_MS, marking embeds still loading as pending
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "8"))
+EMBED_DEADLINE_MS = int(os.getenv("EMBED_DEADLINE_MS", "1500"))
+embed_pool = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+
+# Most pairs /api/getPaths accepts in one request
+MAX_PATH_BATCH = int(os.getenv("MAX_PATH_BATCH", "100"))
 
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -27,30 +128,133 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "connection-images")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-all_nodes = None
+# Largest photo /api/addUserConnection accepts; the whole request may carry
+# another megabyte of form fields
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 1024 * 1024
+# Photos go to Supabase Storage from UPLOAD_WORKERS background threads, so the
+# request returns before the upload finishes; 0 uploads before responding
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "0"))
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "100"))
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+photo_uploader = PhotoUploader(
+    supabase.storage,
+    SUPABASE_BUCKET,
+    workers=UPLOAD_WORKERS,
+    max_queue=UPLOAD_QUEUE_SIZE,
+    retries=UPLOAD_RETRIES
+)
+
+# Path searches are counted in memory and written to Supabase every
+# SEARCH_FLUSH_SECONDS, or sooner once SEARCH_MAX_PENDING pairs are waiting
+SEARCH_FLUSH_SECONDS = int(os.getenv("SEARCH_FLUSH_SECONDS", "10"))
+SEARCH_MAX_PENDING = int(os.getenv("SEARCH_MAX_PENDING", "10000"))
+search_tracker = SearchTracker(supabase, max_pending=SEARCH_MAX_PENDING)
+
+# Largest edit distance the autocomplete typo index tolerates per query word
+AUTOCOMPLETE_MAX_EDIT_DISTANCE = int(os.getenv("AUTOCOMPLETE_MAX_EDIT_DISTANCE", "2"))
+# Autocomplete result cache and substring refinement cache sizes
+AUTOCOMPLETE_CACHE_SIZE = int(os.getenv("AUTOCOMPLETE_CACHE_SIZE", "4096"))
+AUTOCOMPLETE_REFINE_CACHE_SIZE = int(os.getenv("AUTOCOMPLETE_REFINE_CACHE_SIZE", "256"))
+# Directory of memory-mapped name snapshots shared by all workers; unset to load all_nodes.json
+NAME_SNAPSHOT_DIR = os.getenv("NAME_SNAPSHOT_DIR")
+export_options = {"snapshot_dir": NAME_SNAPSHOT_DIR, "max_edit_distance": AUTOCOMPLETE_MAX_EDIT_DISTANCE}
+# "full" re-exports the graph every minute; "incremental" only fetches the people
+# changed since the last sync and rebuilds fully every NODE_FULL_REFRESH_MINUTES,
+# or sooner once more than NODE_MAX_DELTA people have been applied on top
+NODE_REFRESH_MODE = os.getenv("NODE_REFRESH_MODE", "full")
+NODE_FULL_REFRESH_MINUTES = int(os.getenv("NODE_FULL_REFRESH_MINUTES", "60"))
+NODE_MAX_DELTA = int(os.getenv("NODE_MAX_DELTA", "5000"))
+
+# Every autocomplete structure for the current export, swapped in as one object
+name_snapshot = NameSnapshot([])
+# Snapshot numbers; cache keys carry them so results from an older snapshot
+# are never served after a reload
+snapshot_generations = itertools.count(1)
+
+autocomplete_cache = LRUCache(maxsize=AUTOCOMPLETE_CACHE_SIZE)
+substring_cache = LRUCache(maxsize=AUTOCOMPLETE_REFINE_CACHE_SIZE)
+substring_refinements = 0
+# Serializes full and incremental refreshes so neither publishes over the other
+refresh_lock = threading.Lock()
 
 def load_all_nodes():
-    global all_nodes, name_cleaned_list, name_display_map
+    if NAME_SNAPSHOT_DIR:
+        # Map the newest binary snapshot; nothing to do if it is already in use
+        for path in snapshot_paths(NAME_SNAPSHOT_DIR):
+            if path == name_snapshot.source:
+                return
+            try:
+                snapshot = NameSnapshot.open(path, generation=next(snapshot_generations))
+            except FileNotFoundError:
+                # Pruned by a newer export since the directory was listed; try the next newest
+                continue
+            print(f"Mapped name snapshot {path}")
+            publish_snapshot(snapshot)
+            return
+
     print("Loading all nodes...")
+    nodes = []
+    change_marker = 0
     with open('all_nodes.json', 'r') as file:
-        all_nodes = json.load(file)
+        # Keep only the two properties autocomplete uses; the full dicts go right away
+        for entry in json.load(file):
+            nodes.append((entry['name'], entry['name_cleaned']))
+            change_marker = max(change_marker, entry.get('version') or 0)
+
+    # Build everything off to the side, then publish with a single reference swap
+    publish_snapshot(NameSnapshot(
+        nodes,
+        generation=next(snapshot_generations),
+        max_edit_distance=AUTOCOMPLETE_MAX_EDIT_DISTANCE,
+        change_marker=change_marker
+    ))
 
-        name_cleaned_list = [entry['name_cleaned'] for entry in all_nodes]
+def publish_snapshot(snapshot):
+    global name_snapshot
+    name_snapshot = snapshot
+
+    # Cached autocomplete results belong to the previous snapshot
+    autocomplete_cache.clear()
+    substring_cache.clear()
+
+def full_refresh():
+    """Re-export every person and load the result"""
+    with refresh_lock:
+        connector.export_all_nodes(**export_options)
+        load_all_nodes()
+
+def refresh_changed_nodes():
+    """Apply the people changed since the current snapshot, or rebuild if too many have piled up"""
+    with refresh_lock:
+        snapshot = name_snapshot
+        changes = connector.get_changed_nodes(snapshot.change_marker)
+        if not changes:
+            return
+        if len(snapshot.changes) + len(changes) > NODE_MAX_DELTA:
+            print(f"{len(changes)} more changed nodes exceed the delta limit, rebuilding...")
+            connector.export_all_nodes(**export_options)
+            load_all_nodes()
+            return
+        print(f"Applying {len(changes)} changed nodes...")
+        publish_snapshot(snapshot.with_changes(changes, generation=next(snapshot_generations)))
 
-        # Allow multiple names for the same cleaned name
-        name_display_map = defaultdict(list)
-        for entry in all_nodes:
-            name_display_map[entry['name_cleaned']].append(entry['name'])
 export_scheduler = BackgroundScheduler(daemon=True)
-export_scheduler.add_job(connector.export_all_nodes, 'interval', minutes=1)  # Run every hour
 export_scheduler1 = BackgroundScheduler(daemon=True)
-export_scheduler1.add_job(load_all_nodes, 'interval', minutes=1)  # Run every hour
+export_scheduler.add_job(connector.refresh_graph, 'interval', minutes=1)
+if NODE_REFRESH_MODE == "incremental":
+    export_scheduler.add_job(full_refresh, 'interval', minutes=NODE_FULL_REFRESH_MINUTES)
+    export_scheduler1.add_job(refresh_changed_nodes, 'interval', minutes=1)
+else:
+    export_scheduler.add_job(connector.export_all_nodes, 'interval', minutes=1, kwargs=export_options)  # Run every hour
+    export_scheduler1.add_job(load_all_nodes, 'interval', minutes=1)  # Run every hour
+export_scheduler1.add_job(search_tracker.flush, 'interval', seconds=SEARCH_FLUSH_SECONDS)
 export_scheduler.start()
 export_scheduler1.start()
-
-
-name_cleaned_list = []
-name_display_map = {}
+# Write out the searches still buffered when the process exits
+atexit.register(search_tracker.flush)
+atexit.register(rating_coalescer.close)
+atexit.register(photo_uploader.close)
 
 init_flag = False
 
@@ -58,8 +262,9 @@ init_flag = False
 def startup():
     global init_flag
     if not init_flag:
-        connector.export_all_nodes()
+        connector.export_all_nodes(**export_options)
         load_all_nodes()
+        connector.refresh_graph()
         init_flag = True
 
     
@@ -79,53 +284,182 @@ def getInfo():
         count = track_search(person1, person2)
         # Add the count to the path dictionary
         path["timesVisited"] = count
+        if request.args.get('embed', 'false').lower() == 'true':
+            attach_embeds(path["relationships"])
         return path
     else:
         return f"No path found between {person1} and {person2}", 404
 
+def attach_embeds(relationships):
+    """
+    Add each relationship's embed HTML, fetching them all at once.
+
+    Sets "embedHTML" and an "embedStatus" of "ready", "error", or "pending"
+    for embeds not fetched within EMBED_DEADLINE_MS. Fetches already running
+    at the deadline carry on in the background, so a later /api/getEmbed for
+    them hits the cache; those still queued are cancelled, so a slow iframely
+    cannot build a backlog that later requests wait behind.
+    """
+    futures = {}
+    for relationship in relationships:
+        landing_url = relationship.get("landingUrl")
+        if landing_url and landing_url not in futures:
+            futures[landing_url] = embed_pool.submit(fetch_embed, landing_url)
+    wait(futures.values(), timeout=EMBED_DEADLINE_MS / 1000)
+    for future in futures.values():
+        # A no-op for fetches that have started
+        future.cancel()
+
+    for relationship in relationships:
+        future = futures.get(relationship.get("landingUrl"))
+        if future is None:
+            relationship["embedHTML"] = ""
+            relationship["embedStatus"] = "ready"
+        elif future.cancelled() or not future.done():
+            relationship["embedHTML"] = None
+            relationship["embedStatus"] = "pending"
+        elif future.exception() is not None:
+            print(f"Error getting embed HTML: {future.exception()}")
+            relationship["embedHTML"] = None
+            relationship["embedStatus"] = "error"
+        else:
+            relationship["embedHTML"] = future.result()
+            relationship["embedStatus"] = "ready"
+
+@app.route('/api/getPaths', methods=['POST'])
+def getPaths():
+    data = request.json
+    pairs = data.get('pairs') if data else None
+    if not isinstance(pairs, list) or not pairs:
+        return {"message": "Missing pairs"}, 400
+    if len(pairs) > MAX_PATH_BATCH:
+        return {"message": f"At most {MAX_PATH_BATCH} pairs per request"}, 400
+
+    # Each pair is {"person1": ..., "person2": ...} or [person1, person2]
+    results = [None] * len(pairs)
+    valid = []
+    for i, pair in enumerate(pairs):
+        if isinstance(pair, dict):
+            person1, person2 = pair.get('person1'), pair.get('person2')
+        elif isinstance(pair, list) and len(pair) == 2:
+            person1, person2 = pair
+        else:
+            person1 = person2 = None
+        if not person1 or not person2 or not isinstance(person1, str) or not isinstance(person2, str):
+            results[i] = {"person1": person1, "person2": person2, "error": "Missing person1 or person2 parameter"}
+        elif person1 == person2:
+            results[i] = {"person1": person1, "person2": person2, "error": f"person1 and person2 are the same: {person1}"}
+        else:
+            valid.append((i, (person1, person2)))
+
+    try:
+        paths = connector.get_shortest_paths([pair for _, pair in valid])
+    except Exception as e:
+        print(f"Error finding paths: {e}")
+        return {"message": f"Error: {str(e)}"}, 500
+
+    found = [(i, pair, path) for (i, pair), path in zip(valid, paths) if path]
+    # One Supabase round trip per kind of write for the whole batch
+    counts = track_searches([pair for _, pair, _ in found])
+    for (i, (person1, person2), path), count in zip(found, counts):
+        path["timesVisited"] = count
+        results[i] = {"person1": person1, "person2": person2, "path": path}
+    for (i, (person1, person2)), path in zip(valid, paths):
+        if not path:
+            results[i] = {"person1": person1, "person2": person2, "error": f"No path found between {person1} and {person2}"}
+
+    return {"results": results}
+
+@app.route('/api/neo4jStats', methods=['GET'])
+def getNeo4jStats():
+    return connector.pool_stats()
+
+@app.route('/api/pathStats', methods=['GET'])
+def getPathStats():
+    components = connector.components
+    return {
+        "cache": connector.path_cache.stats(),
+        "assets": connector.asset_cache.stats(),
+        "components": components.component_count if components is not None else None,
+        "searches": search_tracker.stats(),
+        "ratings": rating_coalescer.stats()
+    }
+
 def track_search(person1, person2):
-    """Record a search between two people in Supabase and return the count"""
+    """Record a search between two people and return the count"""
+    return track_searches([(person1, person2)])[0]
+
+def track_searches(pairs):
+    """
+    Record many searches at once and return each pair's count.
+
+    Searches are buffered by search_tracker and written to Supabase in the
+    background; a pair repeated in the batch counts once per occurrence.
+    """
     try:
-        # Sort names alphabetically for consistent entry
-        names = sorted([person1, person2])
-        
-        # Check if this pair already exists
-        response = supabase.table("connection_searches").select("*").eq("person1", names[0]).eq("person2", names[1]).execute()
-        
-        if response.data and len(response.data) > 0:
-            # Update existing record
-            search_record = response.data[0]
-            count = search_record.get("count", 0) + 1
-            
-            supabase.table("connection_searches").update({
-                "count": count, 
-                "last_searched": datetime.now().isoformat()
-            }).eq("id", search_record["id"]).execute()
-            return count
-        else:
-            # Create new record
-            supabase.table("connection_searches").insert({
-                "person1": names[0],
-                "person2": names[1],
-                "count": 1,
-                "first_searched": datetime.now().isoformat(),
-                "last_searched": datetime.now().isoformat()
-            }).execute()
-            return 1
+        return search_tracker.record(pairs)
     except Exception as e:
-        print(f"Error tracking search in Supabase: {e}")
-        return 0
+        print(f"Error tracking searches: {e}")
+        return [0] * len(pairs)
 
 @app.route('/api/autocomplete', methods=['GET'])
 def getAutocomplete():
     person = request.args.get('person')
     if not person:
         return "Missing person1 or person2 parameter", 400
-    results = fuzzy_search_people(person.lower())
+    results = cached_fuzzy_search_people(person.lower())
     return results
 
+@app.route('/api/autocompleteStats', methods=['GET'])
+def getAutocompleteStats():
+    return {
+        "generation": name_snapshot.generation,
+        "changeMarker": name_snapshot.change_marker,
+        "pendingChanges": len(name_snapshot.changes),
+        "results": autocomplete_cache.stats(),
+        "substrings": substring_cache.stats(),
+        "substringRefinements": substring_refinements
+    }
+
+def cached_fuzzy_search_people(query, limit=10, cutoff=40):
+    """fuzzy_search_people behind an LRU cache scoped to the current snapshot"""
+    snapshot = name_snapshot
+    key = (snapshot.generation, query, limit, cutoff)
+    results = autocomplete_cache.get(key)
+    if results is None:
+        results = fuzzy_search_people(query, limit, cutoff, snapshot=snapshot, refine=True)
+        autocomplete_cache.put(key, results)
+    return list(results)
+
+def substring_matches(snapshot, query_lower):
+    """
+    Ids of names containing query_lower. When a shorter query that this one
+    extends is cached, its matches are filtered instead of searching the index.
+    """
+    global substring_refinements
+    ids = substring_cache.get((snapshot.generation, query_lower))
+    if ids is not None:
+        return ids
+
+    ids = None
+    for end in range(len(query_lower) - 1, 0, -1):
+        previous = substring_cache.peek((snapshot.generation, query_lower[:end]))
+        if previous is not None:
+            lowered = snapshot.prefix_index.lowered
+            ids = frozenset(i for i in previous if query_lower in lowered[i])
+            substring_refinements += 1
+            break
+    if ids is None:
+        ids = frozenset(snapshot.token_index.with_substring(query_lower))
+
+    substring_cache.put((snapshot.generation, query_lower), ids)
+    return ids
+
 def word_match_score(query, name):
-    """Calculate a score for how well each word in the query matches words in the name"""
+    """
+    Calculate a score for how well each word in the query matches words in the name.
+    Autocomplete uses the batched WordScorer, which must stay in step with this.
+    """
     query_words = query.lower().split()
     name_words = name.lower().split()
     
@@ -168,136 +502,118 @@ def word_match_score(query, name):
     
     return final_score
 
-def fuzzy_search_people(query, limit=10, cutoff=40):
+def collect_display_names(snapshot, name_ids, limit):
+    """Expand ranked name ids into unique display names, up to limit"""
+    seen = set()
+    final = []
+
+    for name_id in name_ids:
+        # Display variants are pre-sorted to prioritize shorter, more common versions
+        for display_name in snapshot.display_names(name_id):
+            if display_name not in seen:
+                seen.add(display_name)
+                final.append(display_name)
+
+                # Once we reach our limit, return results
+                if len(final) >= limit:
+                    return final
+
+    return final
+
+def fuzzy_search_people(query, limit=10, cutoff=40, snapshot=None, refine=False):
+    # Work against one snapshot for the whole request, even if a reload lands meanwhile
+    if snapshot is None:
+        snapshot = name_snapshot
+    index = snapshot.prefix_index
+    query_lower = query.lower()
+
     # Skip processing for very short queries (1-2 characters)
     if len(query.strip()) < 3:
-        # For very short queries, only return exact prefix matches
-        prefix_matches = []
-        query_lower = query.lower()
-        
-        for name in name_cleaned_list:
-            name_lower = name.lower()
-            # Only include exact matches or names that start with the query
-            if name_lower == query_lower or name_lower.startswith(query_lower):
-                prefix_matches.append((name, 100 if name_lower == query_lower else 95, 0))
-        
-        # Sort by score and then by name length
-        prefix_matches.sort(key=lambda x: (-x[1], len(x[0])))
-        
-        seen = set()
-        final = []
-        
-        for name_cleaned, _, _ in prefix_matches:
-            display_names = name_display_map[name_cleaned]
-            display_names.sort(key=len)
-            
-            for display_name in display_names:
-                if display_name not in seen:
-                    seen.add(display_name)
-                    final.append(display_name)
-                    
-                    if len(final) >= limit:
-                        return final
-        
-        return final
+        # For very short queries, only return exact prefix matches,
+        # exact matches first and then by name length
+        prefix_ids = index.iter_prefix_matches(query_lower, exact_first=True)
+        return collect_display_names(snapshot, prefix_ids, limit)
 
     # For normal length queries, use the full matching logic
-    # Step 1: Prioritize prefix matches first
-    prefix_matches = []
-    contains_matches = []
+    # Step 1: Prioritize prefix matches first (exact and startswith, shortest first)
+    prefix_count = index.count_prefix_matches(query_lower)
     word_matches = []
     other_matches = []
-    
+    direct_count = prefix_count
+
     # Parse query into words
-    query_lower = query.lower()
     query_words = [w for w in query_lower.split() if len(w) > 1]
-    
-    for name in name_cleaned_list:
-        name_lower = name.lower()
-        word_score = word_match_score(query_lower, name_lower)
-        
-        # Exact match gets highest priority
-        if name_lower == query_lower:
-            prefix_matches.append((name, 100, 0))
-        # Names that start with the query get high priority
-        elif name_lower.startswith(query_lower):
-            prefix_matches.append((name, 95, 0))
-        # Names that contain all query words as distinct parts get medium priority
-        elif query_words and all(q in name_lower.split() for q in query_words):
-            contains_matches.append((name, 90, 0))
-        # Names that contain the query as a substring get lower priority
-        elif query_lower in name_lower:
-            contains_matches.append((name, 85, 0))
-        # Names that have good word-by-word matches
-        elif word_score > 5:
-            word_matches.append((name, 80 + min(word_score, 10), 0))
-    
-    # Sort prefix and contains matches by name length (shorter names first)
-    prefix_matches.sort(key=lambda x: len(x[0]))
-    contains_matches.sort(key=lambda x: len(x[0]))
+
+    # Names that contain all query words as distinct parts (score 90) or the
+    # query as a substring (score 85) share one tier, found via the token index
+    word_ids = snapshot.token_index.with_all_words(query_words)
+    if refine:
+        substring_ids = substring_matches(snapshot, query_lower)
+    else:
+        substring_ids = snapshot.token_index.with_substring(query_lower)
+    # Every prefix match contains the query, so only substring hits can be one
+    matched_ids = word_ids | substring_ids
+    contains_ids = word_ids - substring_ids
+    contains_ids.update(i for i in substring_ids if not index.lowered[i].startswith(query_lower))
+    contains_matches = [(index.names[i], 90 if i in word_ids else 85, i) for i in sorted(contains_ids)]
+
+    # Names that have good word-by-word matches, scored for the whole snapshot at once
+    word_scores = snapshot.word_scorer.score_all(query_lower)
+    for name_id in np.flatnonzero(word_scores > 5).tolist():
+        # Prefix and contains matches are served by the indexes
+        if name_id in matched_ids:
+            continue
+        word_score = float(word_scores[name_id])
+        word_matches.append((index.names[name_id], 80 + min(word_score, 10), name_id))
+
+    # Sort contains matches by name length (shorter names first)
+    contains_matches.sort(key=lambda x: index.lengths[x[2]])
     word_matches.sort(key=lambda x: x[1], reverse=True)  # Sort by score
-    
+    direct_count += sum(index.counts[name_id] for _, _, name_id in contains_matches + word_matches)
+
     # Only use fuzzy search if we don't have enough direct matches
-    combined_matches = prefix_matches + contains_matches + word_matches
-    if len(combined_matches) < limit:
-        # Step 2: Use fuzzy search for remaining matches
+    if direct_count < limit:
+        # Step 2: Use fuzzy search for remaining matches, scoring only names
+        # that share a (possibly misspelt) word with the query. Duplicates are
+        # kept so they take the same number of result slots as before.
+        candidate_ids = [i for i in sorted(snapshot.typo_index.candidates(query_lower)) for _ in range(index.counts[i])]
+        candidate_names = [index.names[i] for i in candidate_ids]
         fuzzy_results = process.extract(
             query,
-            name_cleaned_list,
+            candidate_names,
             scorer=fuzz.WRatio,
             limit=limit * 2,
             score_cutoff=cutoff
         )
-        
+
         # Filter out any results already in our direct matches
-        existing_names = {name for name, _, _ in combined_matches}
-        
+        existing_names = {name for name, _, _ in contains_matches + word_matches}
+
         # Apply more filtering to fuzzy matches to ensure they're relevant
         filtered_fuzzy = []
         for name, score, idx in fuzzy_results:
-            if name in existing_names:
-                continue
-                
             name_lower = name.lower()
-            
+            if name in existing_names or name_lower.startswith(query_lower):
+                continue
+
             # Filter out fuzzy matches that don't have any relationship to the query
             # At least one query word should be partially in the name
             if not any(q in name_lower for q in query_words if len(q) > 1):
                 # If no direct substring match, require a higher fuzzy score
                 if score < 75:  # Increase the threshold for fuzzy matches
                     continue
-            
-            filtered_fuzzy.append((name, score, idx))
-        
+
+            filtered_fuzzy.append((name, score, candidate_ids[idx]))
+
         # Add fuzzy matches to our results
         other_matches = filtered_fuzzy
-    
+
     # Combine all matches with prefix matches first, then contains matches, then fuzzy matches
-    all_results = prefix_matches + contains_matches + word_matches + other_matches
-    
-    # Step 3: Track unique display names to avoid duplicates
-    seen = set()
-    final = []
-    
-    # Step 4: Map cleaned names to their display names
-    for name_cleaned, score, _ in all_results:
-        # Get all display variants for this cleaned name
-        display_names = name_display_map[name_cleaned]
-        
-        # Sort display names to prioritize shorter, more common versions
-        display_names.sort(key=len)
-        
-        # Add each unique display name to results
-        for display_name in display_names:
-            if display_name not in seen:
-                seen.add(display_name)
-                final.append(display_name)
-                
-                # Once we reach our limit, return results
-                if len(final) >= limit:
-                    return final
-    
-    return final
+    prefix_ids = index.iter_prefix_matches(query_lower)
+    other_ids = (name_id for _, _, name_id in contains_matches + word_matches + other_matches)
+
+    # Step 3: Map cleaned names to their unique display names
+    return collect_display_names(snapshot, itertools.chain(prefix_ids, other_ids), limit)
 
 @app.route('/api/updateRating', methods=['GET'])
 def updateRating():
@@ -313,9 +629,14 @@ def updateRating():
     is_like_bool = is_like.lower() in ('true', '1', 't', 'y', 'yes')
     rating_value = 1 if is_like_bool else -1
     
+    relid_int = connector.parse_relid(relid)
+    if relid_int is None:
+        print(f"Relationship ID '{relid}' is not a valid {connector.storage_model} ID")
+        return f"Relationship {relid} not found", 404
+
     try:
-        # Update the rating in Neo4j
-        new_rating = connector.update_relationship_rating(relid, rating_value)
+        # Update the rating in Neo4j, together with other changes arriving meanwhile
+        new_rating = rating_coalescer.add(relid_int, rating_value)
         
         if new_rating is not None:
             return f"Updated relationship {relid} with rating {rating_value}, new total: {new_rating}", 200
@@ -326,6 +647,16 @@ def updateRating():
         print(f"Error updating rating: {e}")
         return f"Error updating rating: {str(e)}", 500
 
+def fetch_embed(landing_url):
+    """Embed HTML for a Getty landing URL, or "" for URLs that are not image pages"""
+    # Only process URLs that match the expected pattern
+    if "/detail/" not in landing_url:
+        return ""
+    # Ensure landingUrl starts with a / for proper joining
+    if not landing_url.startswith('/'):
+        landing_url = '/' + landing_url
+    return embed_fetcher.get("https://www.gettyimages.com" + landing_url)
+
 @app.route('/api/getEmbed', methods=['GET'])
 def getEmbed():
     landing_url = request.args.get('landingUrl')
@@ -333,28 +664,24 @@ def getEmbed():
         return "Missing landingUrl parameter", 400
     
     try:
-        # Only process URLs that match the expected pattern
-        if "/detail/" in landing_url:
-            # Ensure landingUrl starts with a / for proper joining
-            if not landing_url.startswith('/'):
-                landing_url = '/' + landing_url
-                
-            full_url = "https://www.gettyimages.com" + landing_url
-            response = requests.get(f"https://iframely.com/api/try?url={full_url}")
-            if response.status_code == 200:
-                embed_data = json.loads(response.text)
-                embed_html = embed_data.get("code", "")
-                print(f"Returning embed HTML: {embed_html[:100]}...") 
-                return {"embedHTML": embed_html}
-            else:
-                print(f"Error fetching embed: HTTP {response.status_code}")
-                return f"Error fetching embed: {response.status_code}", 500
-        else:
-            return {"embedHTML": ""}, 200
+        embed_html = fetch_embed(landing_url)
+        print(f"Returning embed HTML: {embed_html[:100]}...")
+        return {"embedHTML": embed_html}
+    except EmbedError as e:
+        print(f"Error fetching embed: HTTP {e.status_code}")
+        return f"Error fetching embed: {e.status_code}", 500
     except Exception as e:
         print(f"Error getting embed HTML: {e}")
         return f"Error getting embed HTML: {str(e)}", 500
 
+@app.route('/api/embedStats', methods=['GET'])
+def getEmbedStats():
+    return embed_fetcher.stats()
+
+@app.route('/api/uploadStats', methods=['GET'])
+def getUploadStats():
+    return photo_uploader.stats()
+
 @app.route('/api/addUserConnection', methods=['POST'])
 def add_user_connection():
     try:
@@ -394,42 +721,23 @@ def add_user_connection():
         
         # Process image - either from file upload or URL
         image_url = None
+        upload = None
         
         if image_source == 'upload' and 'photo' in request.files:
             photo = request.files.get('photo')
             
             # Create a unique filename
             filename = f"{uuid.uuid4()}.{photo.filename.split('.')[-1]}"
+            # Read the upload straight from the request, enforcing the size limit as it arrives
+            file_data = read_limited(photo.stream, MAX_UPLOAD_BYTES)
             
-            # Save to temporary file first
-            temp_filepath = os.path.join('/tmp', filename)
-            photo.save(temp_filepath)
-            
-            try:
-                # Upload to Supabase Storage
-                with open(temp_filepath, 'rb') as f:
-                    file_data = f.read()
-                
-                # Upload the file to Supabase bucket
-                upload_response = supabase.storage.from_(SUPABASE_BUCKET).upload(
-                    path=filename,
-                    file=file_data,
-                    file_options={"content-type": photo.content_type}
-                )
-                
-                # Get the public URL
-                image_url = supabase.storage.from_(SUPABASE_BUCKET).get_public_url(filename)
-                
-                # Clean up temporary file
-                os.remove(temp_filepath)
-                
-            except Exception as e:
-                print(f"Error uploading to Supabase: {e}")
-                # Fallback to local storage if Supabase upload fails
-                filepath = os.path.join('uploads', filename)
-                os.makedirs('uploads', exist_ok=True)
-                photo.save(filepath)
-                image_url = filepath
+            if photo_uploader.background:
+                # The photo is uploaded once the contribution is saved; its URL is known already
+                image_url = photo_uploader.public_url(filename)
+                upload = (filename, file_data, photo.content_type)
+            else:
+                # Upload to Supabase Storage, falling back to local storage if that fails
+                image_url = photo_uploader.submit(filename, file_data, photo.content_type)
         
         elif image_source == 'url' and 'photo_url' in request.form:
             # Use the provided URL directly
@@ -454,12 +762,114 @@ def add_user_connection():
         
         result = supabase.table("contributions").insert(contribution_data).execute()
         
+        if upload is not None:
+            # Point the contribution at the local copy if the upload never succeeds
+            def use_fallback(filepath, photo_url=image_url):
+                supabase.table("contributions").update({"photo_path": filepath}).eq("photo_path", photo_url).execute()
+            photo_uploader.submit(*upload, on_fallback=use_fallback)
+        
         return {"message": "Contribution submitted successfully"}, 200
     
+    except (UploadTooLarge, RequestEntityTooLarge):
+        return {"message": f"Photo is larger than {MAX_UPLOAD_BYTES} bytes"}, 413
     except Exception as e:
         print(f"Error submitting contribution: {e}")
         return {"message": f"Error: {str(e)}"}, 500
 
+def encode_cursor(row):
+    """Opaque cursor for the page after row"""
+    return base64.urlsafe_b64encode(json.dumps([row["created_at"], row["id"]]).encode()).decode()
+
+def decode_cursor(cursor):
+    """(created_at, id) of the last row of the previous page"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    # Both values are quoted into a PostgREST filter below
+    if not all(isinstance(value, (str, int)) and '"' not in str(value) and '\\' not in str(value)
+               for value in (created_at, row_id)):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
+
+def unique_ids(item_ids):
+    """Drop repeated ids, keeping the first; rows are looked up by str(id), so 1 and "1" are the same"""
+    unique = {}
+    for item_id in item_ids:
+        unique.setdefault(str(item_id), item_id)
+    return list(unique.values())
+
+def list_moderation_rows(table):
+    """
+    One page of a moderation table, newest first.
+
+    Reads the query parameters:
+        status: Only rows with this status; several may be given comma-separated
+        fields: Comma-separated columns to return; created_at and id are always included
+        limit: Rows per page, 1 to MODERATION_MAX_PAGE_SIZE; MODERATION_PAGE_SIZE by default
+        cursor: nextCursor of the previous page
+
+    Pages are keyset-paginated on (created_at, id), so each one costs the
+    same however deep it is and rows added meanwhile are not repeated.
+
+    Returns:
+        tuple: (rows, nextCursor), nextCursor being None on the last page
+
+    Raises:
+        ValueError: A parameter is malformed
+    """
+    fields = request.args.get('fields')
+    if fields:
+        columns = [column.strip() for column in fields.split(',') if column.strip()]
+        if not columns or not all(FIELD_NAME.match(column) for column in columns):
+            raise ValueError("Invalid fields")
+        # Cursors are built from the sort keys
+        columns += [column for column in ("created_at", "id") if column not in columns]
+        query = supabase.table(table).select(",".join(columns))
+    else:
+        query = supabase.table(table).select("*")
+
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    if len(statuses) == 1:
+        query = query.eq("status", statuses[0])
+    elif statuses:
+        query = query.in_("status", statuses)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")')
+
+    # Parsed here rather than with type=int, which falls back to the default on bad input
+    limit = request.args.get('limit')
+    if limit is None:
+        limit = MODERATION_PAGE_SIZE
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("Invalid limit")
+        # "Every row" is only ever the server's default, never a client's choice
+        if limit <= 0:
+            raise ValueError("Invalid limit")
+        limit = min(limit, MODERATION_MAX_PAGE_SIZE)
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if limit:
+        # One extra row tells whether there is a next page
+        query = query.limit(limit + 1)
+
+    rows = query.execute().data or []
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+def conditional_response(body):
+    """JSON response with an ETag, answered with 304 when it matches If-None-Match"""
+    response = make_response(body)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    return response.make_conditional(request)
+
 @app.route('/api/getContributions', methods=['GET'])
 def get_contributions():
     try:
@@ -473,10 +883,11 @@ def get_contributions():
         # Verify the token (simple check - in production, you'd want to verify with Supabase)
         try:
             # Get contributions from Supabase
-            result = supabase.table("contributions").select("*").execute()
-            contributions = result.data
+            contributions, next_cursor = list_moderation_rows("contributions")
             
-            return {"contributions": contributions}, 200
+            return conditional_response({"contributions": contributions, "nextCursor": next_cursor})
+        except ValueError as e:
+            return {"message": str(e)}, 400
         except Exception as e:
             return {"message": "Unauthorized - Invalid token"}, 401
     
@@ -484,6 +895,37 @@ def get_contributions():
         print(f"Error fetching contributions: {e}")
         return {"message": f"Error: {str(e)}"}, 500
 
+def contribution_connection(contribution):
+    """People, new-person flags and asset of the connection a contribution adds"""
+    # Parse the people data
+    people = json.loads(contribution.get("people", "[]"))
+    is_new_person = json.loads(contribution.get("is_new_person", "[]"))
+    description = contribution.get("description", "")
+    date = contribution.get("date", "")
+    photo_path = contribution.get("photo_path", "")
+    is_owner = contribution.get("is_owner", False)
+    owner_name = contribution.get("owner_name", "")
+    landing_url = contribution.get("landing_url", "")
+    
+    # Get the photographer/artist name
+    artist_name = contribution.get("name", "Unknown")
+    if not is_owner and owner_name:
+        artist_name = owner_name
+    
+    # Create an asset object
+    asset = {
+        "id": str(uuid.uuid4()),
+        "caption": description,
+        "dateCreated": date,
+        "people": people,
+        "thumbUrl": photo_path,  # Using the Supabase URL from the contribution
+        "artist": artist_name,
+        "landingUrl": landing_url if landing_url else photo_path,  # Use landing URL if provided, otherwise use photo path
+        "photoOwner": owner_name if not is_owner else artist_name,
+        "isContributed": True
+    }
+    return people, is_new_person, asset
+
 @app.route('/api/approveContribution', methods=['POST'])
 def approve_contribution():
     try:
@@ -516,39 +958,15 @@ def approve_contribution():
         
         # If approved, update Neo4j
         if approve:
-            # Parse the people data
-            people = json.loads(contribution.get("people", "[]"))
-            is_new_person = json.loads(contribution.get("is_new_person", "[]"))
-            description = contribution.get("description", "")
-            date = contribution.get("date", "")
-            photo_path = contribution.get("photo_path", "")
-            is_owner = contribution.get("is_owner", False)
-            owner_name = contribution.get("owner_name", "")
-            landing_url = contribution.get("landing_url", "")
-            
-            # Get the photographer/artist name
-            artist_name = contribution.get("name", "Unknown")
-            if not is_owner and owner_name:
-                artist_name = owner_name
-            
-            # Create an asset object
-            asset = {
-                "id": str(uuid.uuid4()),
-                "caption": description,
-                "dateCreated": date,
-                "people": people,
-                "thumbUrl": photo_path,  # Using the Supabase URL from the contribution
-                "artist": artist_name,
-                "landingUrl": landing_url if landing_url else photo_path,  # Use landing URL if provided, otherwise use photo path
-                "photoOwner": owner_name if not is_owner else artist_name,
-                "isContributed": True
-            }
+            people, is_new_person, asset = contribution_connection(contribution)
             
             # Update Neo4j with the new connection
             result = connector.add_connection(people, is_new_person, asset)
             
             if not result:
                 return {"message": "Failed to update Neo4j database"}, 500
+
+            return {"message": f"Contribution {new_status} successfully", **result}, 200
         
         return {"message": f"Contribution {new_status} successfully"}, 200
     
@@ -556,6 +974,81 @@ def approve_contribution():
         print(f"Error processing contribution: {e}")
         return {"message": f"Error: {str(e)}"}, 500
 
+@app.route('/api/approveContributions', methods=['POST'])
+def approve_contributions():
+    try:
+        # Get JWT token from request
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return {"message": "Unauthorized - Missing or invalid token"}, 401
+        
+        token = auth_header.split(' ')[1]
+        
+        # Get contribution IDs and approval status
+        data = request.json
+        contribution_ids = data.get('contributionIds') if data else None
+        approve = data.get('approve', False) if data else False
+        
+        if not isinstance(contribution_ids, list) or not contribution_ids \
+                or not all(isinstance(item_id, (str, int)) for item_id in contribution_ids):
+            return {"message": "Missing contribution IDs"}, 400
+        if len(contribution_ids) > MAX_MODERATION_BATCH:
+            return {"message": f"At most {MAX_MODERATION_BATCH} contributions per request"}, 400
+        # Each contribution once, in request order
+        contribution_ids = unique_ids(contribution_ids)
+        
+        # Get every contribution with one query
+        result = supabase.table("contributions").select("*").in_("id", contribution_ids).execute()
+        contributions = {str(row["id"]): row for row in result.data or []}
+        
+        new_status = "approved" if approve else "rejected"
+        results = {}
+        processed = []
+        connections = []
+        for contribution_id in contribution_ids:
+            contribution = contributions.get(str(contribution_id))
+            if contribution is None:
+                results[contribution_id] = {"contributionId": contribution_id, "error": "Contribution not found"}
+            elif not approve:
+                processed.append(contribution_id)
+            else:
+                try:
+                    people, _, asset = contribution_connection(contribution)
+                except (ValueError, TypeError):
+                    people = []
+                if len(people) < 2:
+                    results[contribution_id] = {"contributionId": contribution_id, "error": "Need at least 2 people"}
+                else:
+                    connections.append((contribution_id, people, asset))
+        
+        # Update Neo4j in batched transactions; a failed batch leaves its contributions pending
+        totals = {"nodesCreated": 0, "relationshipsCreated": 0}
+        for start in range(0, len(connections), MODERATION_WRITE_BATCH):
+            batch = connections[start:start + MODERATION_WRITE_BATCH]
+            try:
+                counts = connector.add_connections([(people, asset) for _, people, asset in batch])
+            except Exception as e:
+                print(f"Error adding connections: {e}")
+                for contribution_id, _, _ in batch:
+                    results[contribution_id] = {"contributionId": contribution_id, "error": "Failed to update Neo4j database"}
+                continue
+            for key in totals:
+                totals[key] += counts[key]
+            processed.extend(contribution_id for contribution_id, _, _ in batch)
+        
+        # Update every status in Supabase with one write
+        if processed:
+            supabase.table("contributions").update({"status": new_status}) \
+                .in_("id", [contributions[str(contribution_id)]["id"] for contribution_id in processed]).execute()
+        for contribution_id in processed:
+            results[contribution_id] = {"contributionId": contribution_id, "status": new_status}
+        
+        return {"results": [results[contribution_id] for contribution_id in contribution_ids], **totals}, 200
+    
+    except Exception as e:
+        print(f"Error processing contributions: {e}")
+        return {"message": f"Error: {str(e)}"}, 500
+
 @app.route('/api/reportContent', methods=['POST'])
 def report_content():
     try:
@@ -609,10 +1102,11 @@ def get_reports():
         # Verify the token (simple check - in production, you'd want to verify with Supabase)
         try:
             # Get reports from Supabase
-            result = supabase.table("reports").select("*").execute()
-            reports = result.data
+            reports, next_cursor = list_moderation_rows("reports")
             
-            return {"reports": reports}, 200
+            return conditional_response({"reports": reports, "nextCursor": next_cursor})
+        except ValueError as e:
+            return {"message": str(e)}, 400
         except Exception as e:
             return {"message": "Unauthorized - Invalid token"}, 401
     
@@ -668,6 +1162,82 @@ def review_report():
         print(f"Error reviewing report: {e}")
         return {"message": f"Error: {str(e)}"}, 500
 
+@app.route('/api/reviewReports', methods=['POST'])
+def review_reports():
+    try:
+        # Get JWT token from request
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return {"message": "Unauthorized - Missing or invalid token"}, 401
+        
+        token = auth_header.split(' ')[1]
+        
+        # Get report IDs and deletion flag
+        data = request.json
+        report_ids = data.get('reportIds') if data else None
+        delete_connection = data.get('deleteConnection', False) if data else False
+        
+        if not isinstance(report_ids, list) or not report_ids \
+                or not all(isinstance(item_id, (str, int)) for item_id in report_ids):
+            return {"message": "Missing report IDs"}, 400
+        if len(report_ids) > MAX_MODERATION_BATCH:
+            return {"message": f"At most {MAX_MODERATION_BATCH} reports per request"}, 400
+        # Each report once, in request order
+        report_ids = unique_ids(report_ids)
+        
+        # Get every report with one query
+        result = supabase.table("reports").select("*").in_("id", report_ids).execute()
+        reports = {str(row["id"]): row for row in result.data or []}
+        
+        # Relationship id of every report whose connection should go
+        relids = {}
+        if delete_connection:
+            for report_id in report_ids:
+                report = reports.get(str(report_id))
+                if report is None or report.get("relationship_id") is None:
+                    continue
+                relid = connector.parse_relid(report["relationship_id"])
+                if relid is not None:
+                    relids[report_id] = relid
+        
+        # Delete the relationships in batched transactions. As in reviewReport, reports
+        # are marked reviewed even if their deletion fails
+        unique_relids = sorted(set(relids.values()))
+        deleted = set()
+        failed = set()
+        for start in range(0, len(unique_relids), MODERATION_WRITE_BATCH):
+            batch = unique_relids[start:start + MODERATION_WRITE_BATCH]
+            try:
+                deleted |= connector.delete_relationships(batch)
+            except Exception as e:
+                print(f"Error deleting relationships: {e}")
+                failed.update(batch)
+        
+        # Update every status in Supabase with one write
+        found = [report_id for report_id in report_ids if str(report_id) in reports]
+        if found:
+            supabase.table("reports").update({"status": "reviewed"}) \
+                .in_("id", [reports[str(report_id)]["id"] for report_id in found]).execute()
+        
+        results = []
+        for report_id in report_ids:
+            if str(report_id) not in reports:
+                results.append({"reportId": report_id, "error": "Report not found"})
+                continue
+            item = {"reportId": report_id, "status": "reviewed"}
+            if delete_connection:
+                relid = relids.get(report_id)
+                item["connectionDeleted"] = relid in deleted
+                if relid in failed:
+                    item["error"] = "Failed to delete connection"
+            results.append(item)
+        
+        return {"results": results, "connectionsDeleted": len(deleted)}, 200
+    
+    except Exception as e:
+        print(f"Error reviewing reports: {e}")
+        return {"message": f"Error: {str(e)}"}, 500
+
 @app.route('/api/updateContribution', methods=['POST'])
 def update_contribution():
     try:
@@ -0,0 +1,160 @@
+import json
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lruCache import LRUCache
+
+
+class EmbedError(Exception):
+    """iframely answered with something other than HTTP 200."""
+
+    def __init__(self, status_code):
+        super().__init__(f"iframely returned HTTP {status_code}")
+        self.status_code = status_code
+
+
+class _EmbedStore:
+    """
+    Embed HTML by page URL in a SQLite file, so lookups survive restarts
+    and are shared by every worker on the machine.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._db:
+            # Readers in other workers do not block a writer
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeds (url TEXT PRIMARY KEY, html TEXT, fetched REAL)")
+
+    def get(self, url, max_age):
+        with self._lock:
+            row = self._db.execute("SELECT html, fetched FROM embeds WHERE url = ?", (url,)).fetchone()
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return row[0]
+
+    def put(self, url, html):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO embeds VALUES (?, ?, ?)", (url, html, time.time()))
+
+
+class _Call:
+    """An upstream lookup that concurrent callers for the same URL wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.html = None
+        self.error = None
+
+
+class EmbedFetcher:
+    """
+    Embed HTML from iframely, cached and deduplicated.
+
+    Lookups go through an in-memory LRU cache, then the optional on-disk
+    store, and only then to iframely over a pooled requests.Session with
+    timeouts. Concurrent lookups of the same URL share one upstream call.
+    Failures are not cached.
+    """
+
+    def __init__(self, api_url="https://iframely.com/api/try", cache_size=4096, ttl=86400, store_path=None,
+                 timeout=(3.05, 10), pool_size=10):
+        """
+        Args:
+            api_url (str): iframely endpoint taking the page as its url parameter
+            cache_size (int): Most embeds kept in memory
+            ttl (float): Seconds an embed is served before it is fetched again
+            store_path (str): SQLite file backing the memory cache, or None
+            timeout (tuple): (connect, read) timeout in seconds for iframely
+            pool_size (int): Connections kept open to iframely
+        """
+        self.api_url = api_url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cache = LRUCache(maxsize=cache_size, ttl=ttl)
+        self._store = _EmbedStore(store_path) if store_path else None
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # Lookup in progress by URL
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.shared_calls = 0
+
+    def get(self, url):
+        """
+        Embed HTML for a page.
+
+        Args:
+            url (str): Full page URL
+
+        Returns:
+            str: The embed HTML, empty if iframely has none
+
+        Raises:
+            EmbedError: iframely answered with an error status
+            requests.RequestException: iframely could not be reached in time
+        """
+        html = self.cache.get(url)
+        if html is not None:
+            return html
+
+        with self._lock:
+            call = self._calls.get(url)
+            leader = call is None
+            if leader:
+                # A lookup may have finished since the cache was checked
+                html = self.cache.peek(url)
+                if html is not None:
+                    return html
+                call = self._calls[url] = _Call()
+            else:
+                self.shared_calls += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.html
+
+        try:
+            html = self._store.get(url, self.ttl) if self._store is not None else None
+            if html is None:
+                html = self._fetch(url)
+                if self._store is not None:
+                    self._store.put(url, html)
+            self.cache.put(url, html)
+            call.html = html
+            return html
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[url]
+            call.done.set()
+
+    def _fetch(self, url):
+        with self._lock:
+            self.upstream_calls += 1
+        response = self._session.get(self.api_url, params={"url": url}, timeout=self.timeout)
+        if response.status_code != 200:
+            raise EmbedError(response.status_code)
+        return json.loads(response.text).get("code", "")
+
+    def stats(self):
+        """Cache counters and upstream call counts."""
+        with self._lock:
+            return {
+                "cache": self.cache.stats(),
+                "store": self._store is not None,
+                "upstreamCalls": self.upstream_calls,
+                "sharedCalls": self.shared_calls,
+                "inFlight": len(self._calls)
+            }
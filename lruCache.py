@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded least-recently-used cache with hit/miss counters
+    and an optional time-to-live.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        Args:
+            maxsize (int): Maximum number of entries kept before evicting the oldest
+            ttl (float): Seconds an entry stays valid after it is stored; None keeps it until evicted
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Look up key, marking it as most recently used.
+
+        Args:
+            key: Cache key
+            default: Value returned when the key is missing
+
+        Returns:
+            The cached value, or default
+        """
+        with self._lock:
+            if self._live(key):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Look up key without touching recency or the hit/miss counters."""
+        with self._lock:
+            return self._entries[key][0] if self._live(key) else default
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entry if full."""
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove key and return its value, or default if it was not cached."""
+        with self._lock:
+            live = self._live(key)
+            entry = self._entries.pop(key, None)
+            return entry[0] if live else default
+
+    def _live(self, key):
+        """Whether key is cached and unexpired; expired entries are dropped. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            return False
+        return True
+
+    def clear(self):
+        """Drop every entry; the counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Current size, capacity, hit/miss counts and hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": self.hits / lookups if lookups else 0.0
+            }
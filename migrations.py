@@ -0,0 +1,96 @@
+import argparse
+import os
+import time
+
+from neo4jInterface import PersonConnector
+
+
+def benchmark_storage(connector, pair_count):
+    """Print the store size of both models and time the same uncached path queries against each."""
+    stats = connector.storage_stats()
+    for model, model_stats in stats.items():
+        print(model, ", ".join(f"{key}={value}" for key, value in model_stats.items()))
+
+    names = [
+        record["name"]
+        for record in connector._read_records(
+            "MATCH (n:Person) RETURN n.name AS name ORDER BY rand() LIMIT $limit", limit=pair_count * 2
+        )
+    ]
+    pairs = list(zip(names[::2], names[1::2]))
+
+    for model in ("pairwise", "photo"):
+        # No path or asset cache and no component check, so every pair is a database round trip
+        model_connector = PersonConnector(
+            os.getenv("NEO4J_URI"), os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"),
+            path_cache_size=0, asset_cache_size=0, component_check=False, storage_model=model
+        )
+        try:
+            timings = []
+            found = 0
+            for pair in pairs:
+                start = time.perf_counter()
+                found += model_connector.get_shortest_path(*pair) is not None
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            model_connector.close()
+        timings.sort()
+        if timings:
+            print(
+                f"{model}: {found}/{len(pairs)} paths, p50 {timings[len(timings) // 2]:.1f} ms, "
+                f"p95 {timings[int(len(timings) * 0.95)]:.1f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One-off Neo4j data migrations")
+    parser.add_argument(
+        "--storage-model", choices=["pairwise", "photo"], default=os.getenv("GRAPH_STORAGE_MODEL", "pairwise"),
+        help="Storage model the app runs with (default: GRAPH_STORAGE_MODEL, else pairwise)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    asset_properties = commands.add_parser(
+        "asset-properties",
+        help="Copy the projected asset fields of every IN_PICTURE_WITH relationship (or Photo, in photo mode) into its properties"
+    )
+    asset_properties.add_argument("--batch-size", type=int, default=1000, help="Relationships updated per transaction")
+
+    photos = commands.add_parser(
+        "photos",
+        help="Convert IN_PICTURE_WITH relationships into Photo nodes for GRAPH_STORAGE_MODEL=photo"
+    )
+    photos.add_argument("--batch-size", type=int, default=1000, help="Relationships converted per transaction")
+    photos.add_argument(
+        "--delete-pairwise", action="store_true",
+        help="Delete the converted relationships (only once the app runs in photo mode)"
+    )
+
+    benchmark = commands.add_parser(
+        "benchmark-storage",
+        help="Compare store size and path latency of both storage models (run after photos, before --delete-pairwise)"
+    )
+    benchmark.add_argument("--pairs", type=int, default=200, help="Random name pairs to time")
+
+    args = parser.parse_args()
+    connector = PersonConnector(
+        os.getenv("NEO4J_URI"), os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD"), storage_model=args.storage_model
+    )
+    try:
+        if args.command == "asset-properties":
+            migrated = connector.migrate_asset_properties(batch_size=args.batch_size)
+            print(f"Migrated {migrated} relationships")
+        elif args.command == "photos":
+            counts = connector.migrate_to_photos(batch_size=args.batch_size, delete_pairwise=args.delete_pairwise)
+            print(
+                f"Converted {counts['relationshipsConverted']} relationships into {counts['photosCreated']} photos, "
+                f"deleted {counts['relationshipsDeleted']} relationships"
+            )
+        elif args.command == "benchmark-storage":
+            benchmark_storage(connector, args.pairs)
+    finally:
+        connector.close()
+
+
+if __name__ == "__main__":
+    main()
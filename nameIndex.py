@@ -0,0 +1,1050 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+import heapq
+import json
+import mmap
+import os
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz.process import cdist
+
+
+# Binary snapshot files written by NameSnapshot.write()
+SNAPSHOT_MAGIC = b"ARCHERNS"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_FILE_PREFIX = "names-"
+SNAPSHOT_FILE_SUFFIX = ".snap"
+# Held by the process building a snapshot, so workers do not build the same one
+SNAPSHOT_LOCK_FILE = "build.lock"
+
+
+def _prefix_range(keys, prefix, lo=0, hi=None):
+    """Return the [lo, hi) slice of sorted keys that start with prefix."""
+    if hi is None:
+        hi = len(keys)
+    if not prefix:
+        return lo, hi
+    start = bisect_left(keys, prefix, lo, hi)
+    last = ord(prefix[-1])
+    if last == 0x10FFFF:
+        return start, hi
+    return start, bisect_left(keys, prefix[:-1] + chr(last + 1), start, hi)
+
+
+def _stable_hash(text):
+    """32-bit hash that is the same in every process, unlike hash()."""
+    return zlib.crc32(text.encode('utf-8', 'surrogatepass'))
+
+
+class StringTable:
+    """
+    Read-only sequence of strings packed into one UTF-8 buffer.
+
+    String i lives at buffer[offsets[i]:offsets[i + 1]] and is decoded on
+    access, so a table costs a few bytes per string instead of a full Python
+    str object each.
+    """
+
+    def __init__(self, strings):
+        """
+        Args:
+            strings (iterable): Strings to pack, in order
+        """
+        offsets = array('q', [0])
+        chunks = []
+        total = 0
+        for string in strings:
+            chunk = string.encode('utf-8', 'surrogatepass')
+            chunks.append(chunk)
+            total += len(chunk)
+            offsets.append(total)
+        self._buffer = b''.join(chunks)
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    @classmethod
+    def from_buffers(cls, buffer, offsets):
+        """Wrap an existing buffer and offsets, e.g. views into a mapped snapshot."""
+        table = cls.__new__(cls)
+        table._buffer = buffer
+        table._offsets = offsets
+        return table
+
+    def __getitem__(self, index):
+        if index < 0 or index >= len(self._offsets) - 1:
+            raise IndexError("StringTable index out of range")
+        return str(self._buffer[self._offsets[index]:self._offsets[index + 1]], 'utf-8', 'surrogatepass')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class _HashedPostings:
+    """
+    Read-only string -> ascending id list map stored as two flat arrays.
+
+    Keys are reduced to a stable 32-bit hash and the (hash, id) pairs are
+    sorted, so a lookup is a binary search and a contiguous slice. A hash
+    collision only merges two posting lists; callers verify their candidates.
+    """
+
+    def __init__(self, pairs):
+        """
+        Args:
+            pairs (iterable): (key, id) tuples
+        """
+        hashes = array('I')
+        ids = array('i')
+        for key, item_id in pairs:
+            hashes.append(_stable_hash(key))
+            ids.append(item_id)
+        hashes = np.frombuffer(hashes, dtype=np.uint32)
+        ids = np.frombuffer(ids, dtype=np.int32)
+        order = np.lexsort((ids, hashes))
+        self._hashes = hashes[order]
+        self._ids = ids[order]
+
+    @classmethod
+    def from_arrays(cls, hashes, ids):
+        """Wrap existing sorted hash and id arrays, e.g. from a mapped snapshot."""
+        postings = cls.__new__(cls)
+        postings._hashes = hashes
+        postings._ids = ids
+        return postings
+
+    def get(self, key):
+        """Return the ids stored under key (plus any colliding key) as an array."""
+        key_hash = np.uint32(_stable_hash(key))
+        lo = np.searchsorted(self._hashes, key_hash, side='left')
+        hi = np.searchsorted(self._hashes, key_hash, side='right')
+        return self._ids[lo:hi]
+
+
+class _SortedKeys:
+    """Sequence view of table[order[i]], for bisecting the length buckets."""
+
+    def __init__(self, table, order):
+        self._table = table
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, index):
+        return self._table[self._order[index]]
+
+
+class PrefixIndex:
+    """
+    Sorted-array index over the cleaned person names used by autocomplete.
+
+    Names are deduplicated (keeping first-seen order as their id), lowercased
+    once, and bucketed by length. Each bucket is sorted so that a prefix lookup
+    is a bisect per bucket, and walking the buckets in length order yields
+    matches shortest first - the same order autocomplete ranks them in.
+    Names are kept in StringTables and every per-name column is a flat array.
+    """
+
+    def __init__(self, names):
+        """
+        Build the index for one snapshot of names.
+
+        Args:
+            names (iterable): Cleaned names in snapshot order, duplicates allowed
+        """
+        unique = []
+        counts = array('i')
+        ids = {}
+        for name in names:
+            name_id = ids.get(name)
+            if name_id is None:
+                ids[name] = len(unique)
+                unique.append(name)
+                counts.append(1)
+            else:
+                counts[name_id] += 1
+        del ids
+        lowered = [name.lower() for name in unique]
+
+        self.names = StringTable(unique)
+        self.lowered = StringTable(lowered)
+        self.counts = counts
+        self.lengths = array('i', (len(name) for name in unique))
+
+        # All ids sorted by (name length, lowered name, id); each length is one bucket
+        order = sorted(range(len(unique)), key=lambda name_id: (self.lengths[name_id], lowered[name_id], name_id))
+        self._order = array('i', order)
+        self._cumulative = array('q', [0])
+        for name_id in order:
+            self._cumulative.append(self._cumulative[-1] + counts[name_id])
+        # (start, end, longest lowered name) per bucket; lowercasing can change
+        # the length of a few characters, so buckets are skipped by the latter
+        self._buckets = []
+        start = 0
+        while start < len(order):
+            length = self.lengths[order[start]]
+            end = start
+            while end < len(order) and self.lengths[order[end]] == length:
+                end += 1
+            longest = max(len(lowered[name_id]) for name_id in order[start:end])
+            self._buckets.append((start, end, longest))
+            start = end
+        self._keys = _SortedKeys(self.lowered, self._order)
+
+    def find(self, name):
+        """Return the id of a cleaned name, or None if the index does not hold it."""
+        for name_id in self._iter_matches(name.lower(), exact=True):
+            if self.names[name_id] == name:
+                return name_id
+        return None
+
+    def _prefix_ranges(self, query_lower):
+        """Return the [lo, hi) range of each bucket that could hold a prefix match."""
+        return [
+            _prefix_range(self._keys, query_lower, start, end)
+            for start, end, longest in self._buckets
+            if longest >= len(query_lower)
+        ]
+
+    def count_prefix_matches(self, query_lower):
+        """
+        Count the snapshot entries (duplicates included) starting with query_lower.
+
+        Args:
+            query_lower (str): Lowercased query
+
+        Returns:
+            int: Number of matching entries in the original name list
+        """
+        total = 0
+        for lo, hi in self._prefix_ranges(query_lower):
+            total += self._cumulative[hi] - self._cumulative[lo]
+        return total
+
+    def iter_prefix_matches(self, query_lower, exact_first=False):
+        """
+        Yield ids of names starting with query_lower, shortest first.
+
+        Ties on length keep snapshot order. Matches are produced lazily so
+        callers that only need the top few never touch the rest.
+
+        Args:
+            query_lower (str): Lowercased query
+            exact_first (bool): Yield exact matches before any other prefix match
+
+        Yields:
+            int: Name id, usable with names/lowered/counts
+        """
+        if exact_first:
+            yield from self._iter_matches(query_lower, exact=True)
+            yield from self._iter_matches(query_lower, exact=False)
+        else:
+            yield from self._iter_matches(query_lower)
+
+    def _iter_matches(self, query_lower, exact=None):
+        """Prefix matches in (length, id) order; exact=True/False keeps only exact/other ones."""
+        for lo, hi in self._prefix_ranges(query_lower):
+            if exact is not None:
+                # Exact matches sort first within their bucket's prefix range
+                exact_end = bisect_right(self._keys, query_lower, lo, hi)
+                lo, hi = (lo, exact_end) if exact else (exact_end, hi)
+            yield from sorted(self._order[lo:hi])
+
+
+class TokenIndex:
+    """
+    Inverted indexes for the "contains" autocomplete tiers.
+
+    Keeps a word -> posting list index over the whitespace-split names and a
+    character n-gram -> posting list index for substring lookups. Posting
+    lists hold name ids in ascending order, so they line up with PrefixIndex.
+    Word postings are one CSR array addressed by word id; n-gram postings are
+    hashed.
+    """
+
+    NGRAM_SIZE = 3
+
+    def __init__(self, lowered):
+        """
+        Build the index for one snapshot of names.
+
+        Args:
+            lowered (sequence): Lowercased, deduplicated names indexed by name id
+        """
+        self.lowered = lowered
+        n = self.NGRAM_SIZE
+
+        postings = defaultdict(list)
+        for name_id, name_lower in enumerate(lowered):
+            for word in set(name_lower.split()):
+                postings[word].append(name_id)
+
+        # Sorted vocabulary; word ids address the CSR posting arrays
+        self.vocabulary = sorted(postings)
+        self.word_ids = {word: word_id for word_id, word in enumerate(self.vocabulary)}
+        self._word_offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        self._word_postings = np.empty(sum(len(ids) for ids in postings.values()), dtype=np.int32)
+        for word_id, word in enumerate(self.vocabulary):
+            ids = postings.pop(word)
+            start = self._word_offsets[word_id]
+            self._word_postings[start:start + len(ids)] = ids
+            self._word_offsets[word_id + 1] = start + len(ids)
+
+        self._ngrams = _HashedPostings(
+            (gram, name_id)
+            for name_id, name_lower in enumerate(lowered)
+            for gram in {name_lower[i:i + n] for i in range(len(name_lower) - n + 1)}
+        )
+
+    @staticmethod
+    def _intersect(postings):
+        """
+        Intersect posting arrays, starting from the shortest one.
+
+        Postings are treated as duplicate-free; a hashed n-gram posting that
+        breaks this can only add candidates, which with_substring verifies.
+        """
+        postings = sorted(postings, key=len)
+        if len(postings) == 1:
+            return set(postings[0].tolist())
+        result = postings[0]
+        for posting in postings[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, posting, assume_unique=True)
+        return set(result.tolist())
+
+    def names_with_word(self, word):
+        """Return the ids of names containing word, in ascending order."""
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            return self._word_postings[:0]
+        return self._word_postings[self._word_offsets[word_id]:self._word_offsets[word_id + 1]]
+
+    def with_all_words(self, words):
+        """
+        Find names whose split words include every one of the given words.
+
+        Args:
+            words (list): Lowercased query words
+
+        Returns:
+            set: Matching name ids
+        """
+        if not words:
+            return set()
+        postings = []
+        for word in set(words):
+            posting = self.names_with_word(word)
+            if not len(posting):
+                return set()
+            postings.append(posting)
+        return self._intersect(postings)
+
+    def with_substring(self, query_lower):
+        """
+        Find names containing query_lower as a substring.
+
+        Candidates come from intersecting the query's n-gram postings and are
+        then verified, since sharing every n-gram does not imply containment.
+
+        Args:
+            query_lower (str): Lowercased query
+
+        Returns:
+            set: Matching name ids
+        """
+        n = self.NGRAM_SIZE
+        if len(query_lower) < n:
+            return {name_id for name_id, name_lower in enumerate(self.lowered) if query_lower in name_lower}
+        postings = []
+        for gram in {query_lower[i:i + n] for i in range(len(query_lower) - n + 1)}:
+            posting = self._ngrams.get(gram)
+            if not len(posting):
+                return set()
+            postings.append(posting)
+        return {name_id for name_id in self._intersect(postings) if query_lower in self.lowered[name_id]}
+
+
+class TypoIndex:
+    """
+    SymSpell-style deletion-neighbourhood index over the name vocabulary.
+
+    Every word in the TokenIndex is stored under each string reachable by
+    deleting up to max_distance characters from its first PREFIX_LENGTH
+    characters. A misspelt query word is looked up the same way, and the
+    resulting words are verified with a bounded Levenshtein distance. Words
+    that merely start with the query word are included too, so partially typed
+    words still find their names.
+    """
+
+    PREFIX_LENGTH = 7
+
+    def __init__(self, token_index, max_distance=2):
+        """
+        Build the index for one snapshot of names.
+
+        Args:
+            token_index (TokenIndex): Word postings for the same snapshot
+            max_distance (int): Largest edit distance treated as a typo
+        """
+        self.token_index = token_index
+        self.max_distance = max_distance
+        self._deletes = _HashedPostings(
+            (variant, word_id)
+            for word_id, word in enumerate(token_index.vocabulary)
+            for variant in self._delete_variants(word[:self.PREFIX_LENGTH], max_distance)
+        )
+
+    @staticmethod
+    def _delete_variants(word, distance):
+        """Return word plus every string reachable by up to distance deletions."""
+        variants = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    def _word_distance(self, word):
+        """Edit distance allowed for a query word; short words must match exactly."""
+        return max(0, min(self.max_distance, len(word) - 2))
+
+    def similar_words(self, word):
+        """
+        Find vocabulary words within the edit-distance bound of word.
+
+        Args:
+            word (str): Lowercased query word
+
+        Returns:
+            set: Matching vocabulary words, including words starting with word
+        """
+        vocabulary = self.token_index.vocabulary
+        distance = self._word_distance(word)
+        matches = set()
+        for variant in self._delete_variants(word[:self.PREFIX_LENGTH], distance):
+            for word_id in self._deletes.get(variant).tolist():
+                candidate = vocabulary[word_id]
+                if Levenshtein.distance(word, candidate, score_cutoff=distance) <= distance:
+                    matches.add(candidate)
+        lo, hi = _prefix_range(vocabulary, word)
+        matches.update(vocabulary[lo:hi])
+        return matches
+
+    def candidates(self, query_lower):
+        """
+        Collect the names worth fuzzy-scoring for a possibly misspelt query.
+
+        Args:
+            query_lower (str): Lowercased query
+
+        Returns:
+            set: Ids of names containing at least one word similar to a query word
+        """
+        name_ids = set()
+        for query_word in set(query_lower.split()):
+            for word in self.similar_words(query_word):
+                name_ids.update(self.token_index.names_with_word(word).tolist())
+        return name_ids
+
+
+class WordScorer:
+    """
+    Batched version of app.word_match_score over every name in a snapshot.
+
+    Scores each distinct query word against the word vocabulary once (a single
+    cdist call for the fuzzy part, lookups for the exact/prefix/contains
+    rules), then reduces those per-word scores onto names through a CSR
+    layout of name -> word ids. The arithmetic mirrors word_match_score step
+    for step, so the scores are bit-for-bit identical.
+    """
+
+    def __init__(self, token_index):
+        """
+        Build the name -> word layout for one snapshot of names.
+
+        Args:
+            token_index (TokenIndex): Word postings for the same snapshot
+        """
+        self.vocabulary = token_index.vocabulary
+        self._vocabulary_array = np.array(self.vocabulary, dtype=str)
+        self._word_ids = token_index.word_ids
+
+        # Names without any words always score 0 and are left out of the CSR
+        self.name_count = len(token_index.lowered)
+        scored_names = array('i')
+        offsets = array('q')
+        flat_word_ids = array('i')
+        for name_id, name_lower in enumerate(token_index.lowered):
+            words = set(name_lower.split())
+            if words:
+                scored_names.append(name_id)
+                offsets.append(len(flat_word_ids))
+                flat_word_ids.extend(self._word_ids[word] for word in words)
+        self._scored_names = np.frombuffer(scored_names, dtype=np.int32)
+        self._offsets = np.frombuffer(offsets, dtype=np.int64)
+        self._flat_word_ids = np.frombuffer(flat_word_ids, dtype=np.int32)
+
+    def _vocabulary_scores(self, query_word, fuzzy_scores):
+        """Best-match score of query_word against every vocabulary word."""
+        scores = fuzzy_scores / 20
+        # Word contains query word
+        scores[np.char.find(self._vocabulary_array, query_word) >= 0] = 4
+        # Query word starts with word
+        for end in range(1, len(query_word) + 1):
+            word_id = self._word_ids.get(query_word[:end])
+            if word_id is not None:
+                scores[word_id] = 6
+        # Word starts with query word
+        lo, hi = _prefix_range(self.vocabulary, query_word)
+        scores[lo:hi] = 8
+        # Exact word match
+        word_id = self._word_ids.get(query_word)
+        if word_id is not None:
+            scores[word_id] = 10
+        return scores
+
+    def score_all(self, query):
+        """
+        Compute word_match_score(query, name) for every name in the snapshot.
+
+        Args:
+            query (str): Query string
+
+        Returns:
+            numpy.ndarray: float64 scores indexed by name id
+        """
+        final_scores = np.zeros(self.name_count, dtype=np.float64)
+        query_words = query.lower().split()
+        if not query_words or not len(self._scored_names):
+            return final_scores
+
+        unique_words = list(dict.fromkeys(query_words))
+        fuzzy = cdist(unique_words, self.vocabulary, scorer=fuzz.ratio, dtype=np.float64)
+        best_per_word = {}
+        for row, query_word in enumerate(unique_words):
+            vocabulary_scores = self._vocabulary_scores(query_word, fuzzy[row])
+            best_per_word[query_word] = np.maximum.reduceat(vocabulary_scores[self._flat_word_ids], self._offsets)
+
+        total_score = np.zeros(len(self._scored_names), dtype=np.float64)
+        matched_words = np.zeros(len(self._scored_names), dtype=np.float64)
+        for query_word in query_words:
+            best_word_score = best_per_word[query_word]
+            total_score += best_word_score
+            matched_words += best_word_score > 0
+
+        # Multiply by the ratio of query words that matched
+        match_ratio = matched_words / len(query_words)
+        final_scores[self._scored_names] = total_score * match_ratio
+        return final_scores
+
+
+class NameSnapshot:
+    """
+    Every autocomplete structure for one export of the graph, built together.
+
+    A snapshot is never modified after construction: load_all_nodes builds a
+    new one and publishes it with a single reference swap, so a request that
+    grabbed a snapshot sees one consistent set of names and indexes throughout.
+    Display names are packed into one StringTable, grouped per name id and
+    pre-sorted shortest first; the group for name id i is the index range
+    display_offsets[i]:display_offsets[i + 1].
+    """
+
+    def __init__(self, nodes, generation=0, max_edit_distance=2, change_marker=0):
+        """
+        Args:
+            nodes (iterable): (name, name_cleaned) pairs, one per exported node
+            generation (int): Snapshot number, used to scope cached results
+            max_edit_distance (int): Edit-distance bound for the typo index
+            change_marker (int): Highest :Person version included in nodes
+        """
+        nodes = list(nodes)
+        self.generation = generation
+        self.change_marker = change_marker
+        # People applied on top of the export; always empty for a full snapshot
+        self.changes = {}
+        self.prefix_index = PrefixIndex(name_cleaned for _, name_cleaned in nodes)
+
+        # Allow multiple display names for the same cleaned name
+        ids = {name_cleaned: name_id for name_id, name_cleaned in enumerate(self.prefix_index.names)}
+        grouped = [[] for _ in range(len(ids))]
+        for name, name_cleaned in nodes:
+            grouped[ids[name_cleaned]].append(name)
+        del ids, nodes
+
+        self.display_offsets = array('q', [0])
+        flat = []
+        for group in grouped:
+            flat.extend(sorted(dict.fromkeys(group), key=len))
+            self.display_offsets.append(len(flat))
+        self._display_table = StringTable(flat)
+        del grouped, flat
+
+        self.token_index = TokenIndex(self.prefix_index.lowered)
+        self.typo_index = TypoIndex(self.token_index, max_distance=max_edit_distance)
+        self.word_scorer = WordScorer(self.token_index)
+        # Path of the binary snapshot this was mapped from, if any
+        self.source = None
+
+    def _sections(self):
+        """Every array backing the snapshot, by section name."""
+        prefix_index = self.prefix_index
+        token_index = self.token_index
+        vocabulary = StringTable(token_index.vocabulary)
+        return {
+            "names.buffer": prefix_index.names._buffer,
+            "names.offsets": prefix_index.names._offsets,
+            "lowered.buffer": prefix_index.lowered._buffer,
+            "lowered.offsets": prefix_index.lowered._offsets,
+            "counts": prefix_index.counts,
+            "lengths": prefix_index.lengths,
+            "order": prefix_index._order,
+            "cumulative": prefix_index._cumulative,
+            "display.buffer": self._display_table._buffer,
+            "display.offsets": self._display_table._offsets,
+            "display.groups": self.display_offsets,
+            "vocabulary.buffer": vocabulary._buffer,
+            "vocabulary.offsets": vocabulary._offsets,
+            "vocabulary.array": self.word_scorer._vocabulary_array,
+            "words.offsets": token_index._word_offsets,
+            "words.postings": token_index._word_postings,
+            "ngrams.hashes": token_index._ngrams._hashes,
+            "ngrams.ids": token_index._ngrams._ids,
+            "deletes.hashes": self.typo_index._deletes._hashes,
+            "deletes.ids": self.typo_index._deletes._ids,
+            "scorer.names": self.word_scorer._scored_names,
+            "scorer.offsets": self.word_scorer._offsets,
+            "scorer.words": self.word_scorer._flat_word_ids
+        }
+
+    def write(self, path):
+        """
+        Write the snapshot as a binary file that open() can memory-map.
+
+        The file is a magic string, a JSON header (format version, scalar
+        settings and a section directory), then every section's raw bytes
+        at a 64-byte aligned offset. It is written to a temporary file and
+        renamed into place, so readers never see a partial snapshot.
+
+        Args:
+            path (str): Destination file
+        """
+        directory = {}
+        payloads = []
+        offset = 0
+        for name, value in self._sections().items():
+            if isinstance(value, np.ndarray):
+                kind, code, payload = "numpy", value.dtype.str, value.tobytes()
+            elif isinstance(value, array):
+                kind, code, payload = "array", value.typecode, value.tobytes()
+            else:
+                kind, code, payload = "bytes", "B", bytes(value)
+            offset += -offset % 64
+            directory[name] = [offset, len(payload), kind, code]
+            payloads.append((offset, payload))
+            offset += len(payload)
+
+        header = json.dumps({
+            "format": SNAPSHOT_FORMAT_VERSION,
+            "maxEditDistance": self.typo_index.max_distance,
+            "changeMarker": self.change_marker,
+            "buckets": self.prefix_index._buckets,
+            "sections": directory
+        }).encode('utf-8')
+        data_start = len(SNAPSHOT_MAGIC) + 8 + len(header)
+        data_start += -data_start % 64
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(SNAPSHOT_MAGIC)
+                f.write(len(header).to_bytes(8, "little"))
+                f.write(header)
+                for section_offset, payload in payloads:
+                    f.seek(data_start + section_offset)
+                    f.write(payload)
+                # Trailing empty sections still need their offsets inside the file
+                f.truncate(data_start + offset)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    @classmethod
+    def open(cls, path, generation=0):
+        """
+        Memory-map a snapshot written by write().
+
+        Sections are used in place as read-only views of the mapping, so
+        every worker opening the same file shares its pages through the page
+        cache. Only the word vocabulary and its id map are copied into the
+        process, since the scorers need them as Python objects.
+
+        Args:
+            path (str): Snapshot file
+            generation (int): Snapshot number, used to scope cached results
+
+        Returns:
+            NameSnapshot: The mapped snapshot
+        """
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapping[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a name snapshot")
+        header_start = len(SNAPSHOT_MAGIC) + 8
+        header_length = int.from_bytes(mapping[len(SNAPSHOT_MAGIC):header_start], "little")
+        header = json.loads(mapping[header_start:header_start + header_length])
+        if header["format"] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"{path} has snapshot format {header['format']}, expected {SNAPSHOT_FORMAT_VERSION}")
+        data_start = header_start + header_length
+        data_start += -data_start % 64
+
+        view = memoryview(mapping)
+        sections = {}
+        for name, (offset, length, kind, code) in header["sections"].items():
+            start = data_start + offset
+            if kind == "numpy":
+                dtype = np.dtype(code)
+                sections[name] = np.frombuffer(mapping, dtype=dtype, count=length // dtype.itemsize, offset=start)
+            elif kind == "array":
+                sections[name] = view[start:start + length].cast(code)
+            else:
+                sections[name] = view[start:start + length]
+
+        prefix_index = PrefixIndex.__new__(PrefixIndex)
+        prefix_index.names = StringTable.from_buffers(sections["names.buffer"], sections["names.offsets"])
+        prefix_index.lowered = StringTable.from_buffers(sections["lowered.buffer"], sections["lowered.offsets"])
+        prefix_index.counts = sections["counts"]
+        prefix_index.lengths = sections["lengths"]
+        prefix_index._order = sections["order"]
+        prefix_index._cumulative = sections["cumulative"]
+        prefix_index._buckets = [tuple(bucket) for bucket in header["buckets"]]
+        prefix_index._keys = _SortedKeys(prefix_index.lowered, prefix_index._order)
+
+        token_index = TokenIndex.__new__(TokenIndex)
+        token_index.lowered = prefix_index.lowered
+        token_index.vocabulary = list(StringTable.from_buffers(sections["vocabulary.buffer"], sections["vocabulary.offsets"]))
+        token_index.word_ids = {word: word_id for word_id, word in enumerate(token_index.vocabulary)}
+        token_index._word_offsets = sections["words.offsets"]
+        token_index._word_postings = sections["words.postings"]
+        token_index._ngrams = _HashedPostings.from_arrays(sections["ngrams.hashes"], sections["ngrams.ids"])
+
+        typo_index = TypoIndex.__new__(TypoIndex)
+        typo_index.token_index = token_index
+        typo_index.max_distance = header["maxEditDistance"]
+        typo_index._deletes = _HashedPostings.from_arrays(sections["deletes.hashes"], sections["deletes.ids"])
+
+        word_scorer = WordScorer.__new__(WordScorer)
+        word_scorer.vocabulary = token_index.vocabulary
+        word_scorer._vocabulary_array = sections["vocabulary.array"]
+        word_scorer._word_ids = token_index.word_ids
+        word_scorer.name_count = len(prefix_index.names)
+        word_scorer._scored_names = sections["scorer.names"]
+        word_scorer._offsets = sections["scorer.offsets"]
+        word_scorer._flat_word_ids = sections["scorer.words"]
+
+        snapshot = cls.__new__(cls)
+        snapshot.generation = generation
+        snapshot.change_marker = header.get("changeMarker", 0)
+        snapshot.changes = {}
+        snapshot.prefix_index = prefix_index
+        snapshot.display_offsets = sections["display.groups"]
+        snapshot._display_table = StringTable.from_buffers(sections["display.buffer"], sections["display.offsets"])
+        snapshot.token_index = token_index
+        snapshot.typo_index = typo_index
+        snapshot.word_scorer = word_scorer
+        snapshot.source = path
+        # Views above keep the mapping alive for as long as the snapshot is in use
+        snapshot._mapping = mapping
+        return snapshot
+
+    def __len__(self):
+        return len(self.prefix_index.names)
+
+    def display_names(self, name_id):
+        """Return the display names for a name id, shortest first."""
+        table = self._display_table
+        return [table[i] for i in range(self.display_offsets[name_id], self.display_offsets[name_id + 1])]
+
+    def with_changes(self, nodes, generation=0):
+        """
+        Apply changed people on top of this snapshot without rebuilding it.
+
+        Args:
+            nodes (list): Node dicts (id, name, name_cleaned, version), as
+                returned by PersonConnector.get_changed_nodes
+            generation (int): Snapshot number for the result
+
+        Returns:
+            LayeredSnapshot: This snapshot plus the changes
+        """
+        return LayeredSnapshot(self, _merge_changes({}, nodes), generation=generation)
+
+
+def _merge_changes(changes, nodes):
+    """Return changes updated with nodes, keyed by node id so a re-changed node replaces its entry."""
+    merged = dict(changes)
+    for node in nodes:
+        merged.pop(node["id"], None)
+        merged[node["id"]] = (node["name"], node["name_cleaned"], node["version"])
+    return merged
+
+
+class _LayeredColumn:
+    """Read-only sequence of a base column followed by a delta column, base values optionally raised by extra."""
+
+    def __init__(self, base, delta, extra=None):
+        self._base = base
+        self._delta = delta
+        self._split = len(base)
+        self._extra = extra
+
+    def __len__(self):
+        return self._split + len(self._delta)
+
+    def __getitem__(self, index):
+        if index < self._split:
+            if self._extra:
+                return self._base[index] + self._extra.get(index, 0)
+            return self._base[index]
+        return self._delta[index - self._split]
+
+
+class _LayeredPrefixIndex:
+    """
+    PrefixIndex interface over a base index and a delta index, delta ids offset past the base.
+
+    folded counts, by base id, the new entries whose cleaned name the base already holds.
+    """
+
+    def __init__(self, base, delta, folded):
+        self._base = base
+        self._delta = delta
+        self._split = len(base.names)
+        # The folded entries again, as cleaned names, for prefix counts
+        self._folded = PrefixIndex(base.names[name_id] for name_id, count in folded.items() for _ in range(count))
+        self.names = _LayeredColumn(base.names, delta.names)
+        self.lowered = _LayeredColumn(base.lowered, delta.lowered)
+        self.counts = _LayeredColumn(base.counts, delta.counts, folded)
+        self.lengths = _LayeredColumn(base.lengths, delta.lengths)
+
+    def count_prefix_matches(self, query_lower):
+        return (
+            self._base.count_prefix_matches(query_lower)
+            + self._delta.count_prefix_matches(query_lower)
+            + self._folded.count_prefix_matches(query_lower)
+        )
+
+    iter_prefix_matches = PrefixIndex.iter_prefix_matches
+
+    def _iter_matches(self, query_lower, exact=None):
+        # Both streams are in (length, id) order; on equal length the base comes first
+        delta_ids = (self._split + name_id for name_id in self._delta._iter_matches(query_lower, exact))
+        return heapq.merge(self._base._iter_matches(query_lower, exact), delta_ids, key=self.lengths.__getitem__)
+
+
+class _LayeredTokenIndex:
+    """TokenIndex lookups over a base index and a delta index."""
+
+    def __init__(self, base, delta, split):
+        self._base = base
+        self._delta = delta
+        self._split = split
+        self.lowered = _LayeredColumn(base.lowered, delta.lowered)
+
+    def with_all_words(self, words):
+        return self._base.with_all_words(words) | {self._split + i for i in self._delta.with_all_words(words)}
+
+    def with_substring(self, query_lower):
+        return self._base.with_substring(query_lower) | {self._split + i for i in self._delta.with_substring(query_lower)}
+
+
+class _LayeredTypoIndex:
+    """TypoIndex candidates over a base index and a delta index."""
+
+    def __init__(self, base, delta, split):
+        self._base = base
+        self._delta = delta
+        self._split = split
+        self.max_distance = base.max_distance
+
+    def candidates(self, query_lower):
+        return self._base.candidates(query_lower) | {self._split + i for i in self._delta.candidates(query_lower)}
+
+
+class _LayeredWordScorer:
+    """WordScorer over a base snapshot and a delta snapshot."""
+
+    def __init__(self, base, delta):
+        self._base = base
+        self._delta = delta
+
+    def score_all(self, query):
+        return np.concatenate((self._base.score_all(query), self._delta.score_all(query)))
+
+
+class LayeredSnapshot:
+    """
+    A NameSnapshot plus the people added or changed since it was exported.
+
+    A change whose cleaned name the base already holds joins that name's
+    entry, adding its display name and count. The other changes are indexed
+    as a small NameSnapshot of their own, and every lookup runs against both,
+    with delta ids following the base ids - so results rank as if the new
+    people had been appended to the export. The interface matches
+    NameSnapshot, and like it a LayeredSnapshot is never modified:
+    with_changes returns a new one. A changed person that is already in the
+    base keeps its old entry there until the next full rebuild.
+    """
+
+    def __init__(self, base, changes, generation=0):
+        """
+        Args:
+            base (NameSnapshot): Snapshot built from a full export
+            changes (dict): node id -> (name, name_cleaned, version), oldest change first
+            generation (int): Snapshot number, used to scope cached results
+        """
+        self.base = base
+        self.changes = changes
+        self.generation = generation
+        self.change_marker = max([base.change_marker] + [version for _, _, version in changes.values()])
+        self.source = base.source
+
+        # Display names added to existing base entries, by base id
+        self._folded = {}
+        added = []
+        for name, name_cleaned, _ in changes.values():
+            base_id = base.prefix_index.find(name_cleaned)
+            if base_id is None:
+                added.append((name, name_cleaned))
+            else:
+                self._folded.setdefault(base_id, []).append(name)
+        self.delta = NameSnapshot(added, max_edit_distance=base.typo_index.max_distance)
+        split = len(base)
+        self.prefix_index = _LayeredPrefixIndex(
+            base.prefix_index,
+            self.delta.prefix_index,
+            {name_id: len(names) for name_id, names in self._folded.items()}
+        )
+        self.token_index = _LayeredTokenIndex(base.token_index, self.delta.token_index, split)
+        self.typo_index = _LayeredTypoIndex(base.typo_index, self.delta.typo_index, split)
+        self.word_scorer = _LayeredWordScorer(base.word_scorer, self.delta.word_scorer)
+
+    def __len__(self):
+        return len(self.base) + len(self.delta)
+
+    def display_names(self, name_id):
+        """Return the display names for a name id, shortest first."""
+        split = len(self.base)
+        if name_id < split:
+            names = self.base.display_names(name_id)
+            folded = self._folded.get(name_id)
+            return sorted(dict.fromkeys(names + folded), key=len) if folded else names
+        return self.delta.display_names(name_id - split)
+
+    def with_changes(self, nodes, generation=0):
+        """Return a LayeredSnapshot over the same base with nodes applied on top of these changes."""
+        return LayeredSnapshot(self.base, _merge_changes(self.changes, nodes), generation=generation)
+
+
+def write_versioned_snapshot(snapshot, directory, keep=3):
+    """
+    Write snapshot into directory as a new version and prune old versions.
+
+    Versions are nanosecond timestamps in the file name, so the newest file
+    sorts last. Older files are unlinked, which is safe on POSIX even while
+    another worker still has them mapped.
+
+    Args:
+        snapshot (NameSnapshot): Snapshot to write
+        directory (str): Snapshot directory, created if missing
+        keep (int): Number of most recent versions to keep
+
+    Returns:
+        str: Path of the new snapshot file
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{SNAPSHOT_FILE_PREFIX}{time.time_ns():020d}{SNAPSHOT_FILE_SUFFIX}")
+    snapshot.write(path)
+    for stale in _snapshot_files(directory)[:-keep]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    return path
+
+
+def latest_snapshot_path(directory):
+    """Return the newest snapshot file in directory, or None if there is none."""
+    files = _snapshot_files(directory)
+    return files[-1] if files else None
+
+
+def snapshot_paths(directory):
+    """Snapshot files in directory, newest first."""
+    return _snapshot_files(directory)[::-1]
+
+
+def read_snapshot_header(path):
+    """
+    Read a snapshot file's header without mapping the rest of the file.
+
+    Args:
+        path (str): Snapshot file
+
+    Returns:
+        dict: The header, with format, maxEditDistance and changeMarker
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(len(SNAPSHOT_MAGIC) + 8)
+        if prefix[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a name snapshot")
+        header_length = int.from_bytes(prefix[len(SNAPSHOT_MAGIC):], "little")
+        return json.loads(f.read(header_length))
+
+
+def snapshot_is_current(directory, change_marker, max_edit_distance):
+    """
+    Whether the newest snapshot in directory already covers change_marker.
+
+    People are only ever added, each with a higher version, so a snapshot
+    with the same change marker, format and typo bound holds the same names.
+    """
+    for path in snapshot_paths(directory):
+        try:
+            header = read_snapshot_header(path)
+        except FileNotFoundError:
+            # Pruned by another writer since the directory was listed
+            continue
+        except ValueError:
+            return False
+        return (
+            header.get("format") == SNAPSHOT_FORMAT_VERSION
+            and header.get("maxEditDistance") == max_edit_distance
+            and header.get("changeMarker") == change_marker
+        )
+    return False
+
+
+def _snapshot_files(directory):
+    """Snapshot files in directory, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(names)
+        if name.startswith(SNAPSHOT_FILE_PREFIX) and name.endswith(SNAPSHOT_FILE_SUFFIX)
+    ]
@@ -1,8 +1,16 @@
-from neo4j import GraphDatabase, basic_auth
+from neo4j import GraphDatabase, basic_auth, unit_of_work
 import json
 import time
 import requests
 import os # Import os
+import uuid
+import tempfile
+import threading
+import fcntl
+from array import array
+from nameIndex import SNAPSHOT_LOCK_FILE, NameSnapshot, snapshot_is_current, write_versioned_snapshot
+from pathGraph import ComponentIndex, PathGraph, PersonNames, dense_edges
+from lruCache import LRUCache
 
 # Remove hardcoded credentials
 # NEO4J_URI = "neo4j://192.168.1.203"
@@ -11,7 +19,15 @@ import os # Import os
 
 
 class PersonConnector:
-    def __init__(self, uri, user, password): # Keep constructor arguments for flexibility if needed elsewhere
+    # Asset fields returned with each relationship of a path
+    ASSET_KEYS = ["id","thumbUrl","caption","people","artist","landingUrl","dateCreated"]
+    # Photo node ids handed out in photo mode carry this prefix, so an id of a
+    # pairwise relationship can never be taken for a Photo with the same number
+    PHOTO_RELID_PREFIX = "photo:"
+
+    def __init__(self, uri, user, password, path_cache_size=4096, path_cache_ttl=300, path_engine="neo4j", component_check=True,
+                 asset_cache_size=8192, asset_properties=False, storage_model="pairwise", database="neo4j",
+                 max_pool_size=100, acquisition_timeout=60, query_timeout=None, max_retry_time=30): # Keep constructor arguments for flexibility if needed elsewhere
 
         # Use provided arguments or fallback to environment variables
         db_uri = uri or os.getenv("NEO4J_URI")
@@ -21,7 +37,49 @@ class PersonConnector:
         if not all([db_uri, db_user, db_password]):
             raise ValueError("Neo4j connection details (URI, USER, PASSWORD) not found in environment variables or arguments.")
 
-        self._driver = GraphDatabase.driver(db_uri, auth=basic_auth(db_user, db_password))
+        self._driver = GraphDatabase.driver(
+            db_uri,
+            auth=basic_auth(db_user, db_password),
+            max_connection_pool_size=max_pool_size,
+            connection_acquisition_timeout=acquisition_timeout,
+            max_transaction_retry_time=max_retry_time
+        )
+        # Shared by every session, so a read routed to a follower waits until
+        # it has caught up with this process's writes
+        self._bookmark_manager = GraphDatabase.bookmark_manager()
+        self.database = database
+        self.max_pool_size = max_pool_size
+        self.acquisition_timeout = acquisition_timeout
+        # Seconds a transaction may run before the server aborts it; None for the server default
+        self.query_timeout = query_timeout
+        # Session and transaction counters for pool_stats
+        self._stats_lock = threading.Lock()
+        self._active_sessions = 0
+        self._peak_sessions = 0
+        self._transactions = {"read": 0, "write": 0, "retries": 0, "failures": 0}
+        # "memory" answers get_shortest_path from a PathGraph, "neo4j" always queries
+        self.path_engine = path_engine
+        # Reject pairs in different components before any path work
+        self.component_check = component_check
+        # In-memory copies of the graph, once load_graph has run
+        self._path_graph = None
+        self.components = None
+        self._graph_version = None
+        # Newest graph version written by this process; an in-memory graph
+        # older than this is missing its own writes and is not searched
+        self._written_version = 0
+        # Parsed get_shortest_path results by sorted name pair. Writes made here
+        # clear it; the TTL bounds how long other workers' writes go unseen
+        self.path_cache = LRUCache(maxsize=path_cache_size, ttl=path_cache_ttl)
+        # Projected asset dicts by relationship id, evicted when that relationship is written
+        self.asset_cache = LRUCache(maxsize=asset_cache_size)
+        # Also store the projected asset fields as relationship properties, and read them
+        # instead of parsing the asset JSON (see migrate_asset_properties)
+        self.asset_properties = asset_properties
+        # "pairwise" stores a connection as an IN_PICTURE_WITH relationship per pair of
+        # people, each with its own copy of the asset; "photo" stores one (:Photo) node
+        # per asset that every person in it APPEARS_IN. A relid names a Photo node then
+        self.storage_model = storage_model
 
         self._ensure_indexes()
         print("Neo4j Driver Initialized.")
@@ -32,37 +90,454 @@ class PersonConnector:
             self._driver.close()
             print("Neo4j Driver Closed.")
 
+    def _transaction(self, access, work, *args, **session_options):
+        """
+        Run work(tx, *args) as a managed transaction in its own session.
+
+        Reads go through execute_read, so a cluster routes them to followers;
+        the shared bookmark manager makes them see every write this process
+        has committed. Both kinds are retried on transient errors for up to
+        max_retry_time, which means work must be safe to run more than once.
+        """
+        attempts = [0]
+
+        @unit_of_work(timeout=self.query_timeout)
+        def attempt(tx, *args):
+            attempts[0] += 1
+            return work(tx, *args)
+
+        with self._stats_lock:
+            self._active_sessions += 1
+            self._peak_sessions = max(self._peak_sessions, self._active_sessions)
+            self._transactions[access] += 1
+        try:
+            with self._driver.session(
+                database=self.database, bookmark_manager=self._bookmark_manager, **session_options
+            ) as session:
+                run = session.execute_read if access == "read" else session.execute_write
+                return run(attempt, *args)
+        except Exception:
+            with self._stats_lock:
+                self._transactions["failures"] += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self._active_sessions -= 1
+                self._transactions["retries"] += max(attempts[0] - 1, 0)
+
+    def _read(self, work, *args, **session_options):
+        """Run work(tx, *args) in a managed read transaction."""
+        return self._transaction("read", work, *args, **session_options)
+
+    def _write(self, work, *args, **session_options):
+        """Run work(tx, *args) in a managed write transaction."""
+        return self._transaction("write", work, *args, **session_options)
+
+    def _read_records(self, query, **params):
+        """Every record of a read query."""
+        return self._read(lambda tx: list(tx.run(query, **params)))
+
+    def pool_stats(self):
+        """
+        Connection pool settings and session counters.
+
+        The driver does not expose its pool, so sessions are counted here:
+        each one holds a pooled connection while its transaction runs.
+        """
+        with self._stats_lock:
+            return {
+                "database": self.database,
+                "maxPoolSize": self.max_pool_size,
+                "acquisitionTimeout": self.acquisition_timeout,
+                "queryTimeout": self.query_timeout,
+                "activeSessions": self._active_sessions,
+                "peakActiveSessions": self._peak_sessions,
+                "readTransactions": self._transactions["read"],
+                "writeTransactions": self._transactions["write"],
+                "retries": self._transactions["retries"],
+                "failures": self._transactions["failures"]
+            }
+
     def _ensure_indexes(self):
 
-        with self._driver.session(database="neo4j") as session:
-            session.execute_write(self._create_person_name_index)
+        self._write(self._create_person_name_index)
+        self._write(self._create_person_version_index)
+        self._write(self._create_sync_state_constraint)
+        self._write(self._create_photo_asset_constraint)
 
     def get_shortest_path(self, person1, person2):
-        query = """
-        MATCH (p1:Person {name: $person1}), (p2:Person {name: $person2}),
-            path = shortestPath((p1)-[*..10]-(p2))
-        RETURN nodes(path) AS path_nodes, relationships(path) AS path_rels
-        """
-        with self._driver.session(database="neo4j") as session:
-            result = session.run(query, person1=person1, person2=person2)
-            record = result.single()
-            if record:
-                return self.parseShortestPath(record)
+        """
+        Find a shortest path between two people, serving repeated pairs from the path cache.
+
+        Results are cached for the pair in either order, including "no path".
+
+        Returns:
+            dict or None: {"names", "relationships"} from person1 to person2, or None if there is no path
+        """
+        return self.get_shortest_paths([(person1, person2)])[0]
+
+    def get_shortest_paths(self, pairs):
+        """
+        Find shortest paths for many pairs of people at once.
+
+        Pairs in different components and cached pairs are answered in memory.
+        The rest cost at most two round trips in total: one UNWIND query for
+        the pairs Neo4j has to search itself, and one lookup of the assets on
+        the paths found that are not in the asset cache.
+
+        Args:
+            pairs (list): (person1, person2) tuples
+
+        Returns:
+            list: Per pair, {"names", "relationships"} from person1 to person2, or None if there is no path
+        """
+        components = self.components
+        if components is not None and self._written_version > (components.version or 0):
+            # Built before a write made here; its "no path" may miss those connections
+            components = None
+        paths = {}
+        missing = []
+        for person1, person2 in pairs:
+            key = tuple(sorted((person1, person2)))
+            if key in paths:
+                continue
+            if components is not None and not components.connected(person1, person2):
+                # Different components, or someone the graph has never seen
+                paths[key] = False
+                continue
+            paths[key] = self.path_cache.get(key)
+            if paths[key] is None:
+                missing.append(key)
+
+        if missing:
+            found = self._find_shortest_paths(missing)
+            for key in missing:
+                # False marks a cached miss, since None means "not cached"
+                paths[key] = found.get(key) or False
+                self.path_cache.put(key, paths[key])
+
+        return [self._oriented_path(paths[tuple(sorted(pair))], pair[0]) for pair in pairs]
+
+    @staticmethod
+    def _oriented_path(path, person1):
+        """Copy a cached path, which runs from the alphabetically first person, to start at person1."""
+        if not path:
+            return None
+
+        # Copies, so callers can add to the result without touching the cache
+        names = list(path["names"])
+        relationships = [dict(relationship) for relationship in path["relationships"]]
+        if names[0] != person1:
+            names.reverse()
+            relationships.reverse()
+        return {"names": names, "relationships": relationships}
+
+    def _find_shortest_paths(self, keys, use_graph=True):
+        """
+        Search for the paths of sorted name pairs, in memory where possible.
+
+        Args:
+            keys (list): Sorted (person1, person2) tuples
+            use_graph (bool): Try the in-memory path graph before Neo4j
+
+        Returns:
+            dict: Path for every pair that has one, by pair
+        """
+        # (names, relationship ids) per pair, assets filled in at the end
+        found = {}
+        neo4j_keys = list(keys)
+        graph = self._path_graph if use_graph else None
+        if graph is not None and self._written_version > (graph.version or 0):
+            # Connections made here since the graph was loaded are only in Neo4j
+            graph = None
+        if graph is not None:
+            neo4j_keys = []
+            for key in keys:
+                sources = graph.names.find(key[0])
+                targets = graph.names.find(key[1])
+                # People added since the graph was loaded are only known to Neo4j
+                if not len(sources) or not len(targets):
+                    neo4j_keys.append(key)
+                    continue
+                path = graph.shortest_path(sources, targets)
+                if path is not None:
+                    found[key] = ([graph.names[node] for node in path[0]], path[1])
+                else:
+                    # Pairs known to be apart were dropped by get_shortest_paths, so this
+                    # one may have been connected by another worker since the graph loaded
+                    neo4j_keys.append(key)
+
+        if neo4j_keys and self.storage_model == "photo":
+            # Every connection is two APPEARS_IN hops through its Photo
+            query = """
+            UNWIND range(0, size($pairs) - 1) AS i
+            WITH i, $pairs[i] AS pair
+            MATCH (p1:Person {name: pair[0]}), (p2:Person {name: pair[1]}),
+                path = shortestPath((p1)-[:APPEARS_IN*..20]-(p2))
+            RETURN i, [n IN nodes(path) WHERE n:Person | n.name] AS names,
+                [n IN nodes(path) WHERE n:Photo | id(n)] AS rel_ids
+            """
+        elif neo4j_keys:
+            query = """
+            UNWIND range(0, size($pairs) - 1) AS i
+            WITH i, $pairs[i] AS pair
+            MATCH (p1:Person {name: pair[0]}), (p2:Person {name: pair[1]}),
+                path = shortestPath((p1)-[*..10]-(p2))
+            RETURN i, [n IN nodes(path) | n.name] AS names, [r IN relationships(path) | id(r)] AS rel_ids
+            """
+        if neo4j_keys:
+            for record in self._read_records(query, pairs=[list(key) for key in neo4j_keys]):
+                key = neo4j_keys[record["i"]]
+                # Duplicate names can give a pair several rows; keep the first
+                if key not in found:
+                    found[key] = (record["names"], record["rel_ids"])
+
+        assets = self._get_assets([relid for _, rel_ids in found.values() for relid in rel_ids])
+        paths = {}
+        retry = []
+        for key, (names, rel_ids) in found.items():
+            if not all(relid in assets for relid in rel_ids):
+                # A relationship on the path has been deleted since it was found
+                if key not in neo4j_keys:
+                    retry.append(key)
+                continue
+            paths[key] = {"names": names, "relationships": [assets[relid] for relid in rel_ids]}
+        if retry:
+            # The in-memory graph is behind; let Neo4j answer
+            paths.update(self._find_shortest_paths(retry, use_graph=False))
+        return paths
+
+    def _get_assets(self, rel_ids):
+        """
+        Projected assets of relationships, from the asset cache or one query for the rest.
+
+        Returns:
+            dict: Asset dict (ASSET_KEYS plus the client relid) by relationship id, for those that still exist
+        """
+        assets = {}
+        missing = []
+        for relid in set(rel_ids):
+            asset = self.asset_cache.get(relid)
+            if asset is None:
+                missing.append(relid)
+            else:
+                assets[relid] = asset
+        if not missing:
+            return assets
+
+        if self.asset_properties:
+            # Migrated relationships return just their projected fields
+            query = f"""
+            MATCH {self._connection_pattern()}
+            WHERE id(r) IN $relids
+            RETURN id(r) AS relid,
+                CASE WHEN r.assetFields THEN null ELSE r.asset END AS asset,
+                r {id: r.assetId, .thumbUrl, .caption, .people, .artist, .landingUrl, .dateCreated} AS fields
+            """
+        else:
+            query = f"""
+            MATCH {self._connection_pattern()}
+            WHERE id(r) IN $relids
+            RETURN id(r) AS relid, r.asset AS asset, null AS fields
+            """
+        for record in self._read_records(query, relids=missing):
+            relid = record["relid"]
+            if record["asset"] is not None:
+                asset = self._parse_asset(record["asset"], self._relid(relid))
             else:
+                asset = {key: value for key, value in record["fields"].items() if value is not None}
+                asset["relid"] = self._relid(relid)
+            self.asset_cache.put(relid, asset)
+            assets[relid] = asset
+        return assets
+
+    def _relid(self, internal_id):
+        """The relid clients see for a relationship, or for a Photo in photo mode."""
+        if self.storage_model == "photo":
+            return f"{self.PHOTO_RELID_PREFIX}{internal_id}"
+        return internal_id
+
+    def parse_relid(self, relid):
+        """
+        Internal id of a relid handed out by this connector.
+
+        Args:
+            relid (str or int): Relid from a client
+
+        Returns:
+            int or None: Relationship id (Photo id in photo mode), or None if
+                relid is not one of this storage model's ids
+        """
+        relid = str(relid)
+        if self.storage_model == "photo":
+            if not relid.startswith(self.PHOTO_RELID_PREFIX):
                 return None
+            relid = relid[len(self.PHOTO_RELID_PREFIX):]
+        elif relid.startswith(self.PHOTO_RELID_PREFIX):
+            return None
+        try:
+            return int(relid)
+        except ValueError:
+            return None
+
+    def _connection_pattern(self):
+        """Cypher pattern binding r to a connection: a relationship, or a Photo node in photo mode."""
+        return "(r:Photo)" if self.storage_model == "photo" else "()-[r]->()"
+
+    @classmethod
+    def _parse_asset(cls, asset, relid):
+        relationship = json.loads(asset)
+        relationship = {key: relationship[key] for key in cls.ASSET_KEYS if key in relationship}
+
+        relationship["relid"] = relid
+        return relationship
+
+    @classmethod
+    def _asset_fields(cls, asset):
+        """
+        Relationship properties holding an asset's projected fields, or None
+        if a field cannot be stored as a property and the JSON has to be kept.
+        """
+        fields = {}
+        for key in cls.ASSET_KEYS:
+            value = asset.get(key)
+            if value is None:
+                continue
+            values = value if isinstance(value, list) else [value]
+            if not all(isinstance(item, (str, int, float, bool)) for item in values):
+                return None
+            fields["assetId" if key == "id" else key] = value
+        fields["assetFields"] = True
+        return fields
+
+    def migrate_asset_properties(self, batch_size=1000):
+        """
+        Copy the projected asset fields of every IN_PICTURE_WITH relationship
+        (or Photo node, in photo mode) into its properties, so asset_properties mode can read them
+        without parsing the asset JSON. Safe to rerun; relationships already
+        handled are skipped.
+
+        Args:
+            batch_size (int): Relationships updated per transaction
+
+        Returns:
+            int: Number of relationships migrated
+        """
+        read_query = f"""
+        MATCH {"(r:Photo)" if self.storage_model == "photo" else "()-[r:IN_PICTURE_WITH]->()"}
+        WHERE r.assetFields IS NULL AND r.asset IS NOT NULL
+        RETURN id(r) AS relid, r.asset AS asset
+        LIMIT $batch_size
+        """
+        write_query = f"""
+        UNWIND $rows AS row
+        MATCH {self._connection_pattern()}
+        WHERE id(r) = row.relid
+        SET r += row.fields
+        """
+        migrated = 0
+        while True:
+            rows = []
+            for record in self._read_records(read_query, batch_size=batch_size):
+                # Unstorable assets are marked so they are read as JSON and not picked up again
+                fields = self._asset_fields(json.loads(record["asset"])) or {"assetFields": False}
+                rows.append({"relid": record["relid"], "fields": fields})
+            if not rows:
+                break
+            self._write(lambda tx: tx.run(write_query, rows=rows).consume())
+            migrated += len(rows)
+            print(f"Migrated {migrated} relationships...")
+        return migrated
+
+    def load_graph(self, chunk_size=5000):
+        """
+        Load every person and IN_PICTURE_WITH relationship into the in-memory
+        structures get_shortest_path uses: a ComponentIndex if component_check
+        is on, and a PathGraph if path_engine is "memory".
 
-    def parseShortestPath(self, record):
-        names_list = [dict(node).get("name") for node in record["path_nodes"]]
-        relationships = []
-        for rel in record["path_rels"]:
-            asset = dict(rel).get("asset")
-            relationship = json.loads(asset)
-            keys_to_keep = ["id","thumbUrl","caption","people","artist","landingUrl","dateCreated"]
-            relationship = {key: relationship[key] for key in keys_to_keep if key in relationship}
+        Both are read in one transaction, together with the graph version
+        counter, so the copy is consistent and refresh_graph can tell when it
+        has gone stale.
+
+        Args:
+            chunk_size (int): Records fetched per batch
+        """
+
+        def read_graph(tx):
+            version = self._read_graph_version(tx)
+            node_ids = array('q')
+            names = []
+            for record in tx.run("MATCH (n:Person) RETURN id(n) AS id, n.name AS name"):
+                node_ids.append(record["id"])
+                names.append(record["name"] or "")
+            sources = array('q')
+            targets = array('q')
+            rel_ids = array('q')
+            if self.storage_model == "photo":
+                # Each Photo becomes an edge between every two people in it, in memory only
+                query = """
+                MATCH (a:Person)-[:APPEARS_IN]->(r:Photo)<-[:APPEARS_IN]-(b:Person)
+                WHERE id(a) < id(b)
+                RETURN id(a) AS source, id(b) AS target, id(r) AS relid
+                """
+            else:
+                query = """
+                MATCH (a:Person)-[r:IN_PICTURE_WITH]->(b:Person)
+                RETURN id(a) AS source, id(b) AS target, id(r) AS relid
+                """
+            for record in tx.run(query):
+                sources.append(record["source"])
+                targets.append(record["target"])
+                rel_ids.append(record["relid"])
+            return node_ids, names, sources, targets, rel_ids, version
+
+        print("Loading graph...")
+        node_ids, names, sources, targets, rel_ids, version = self._read(read_graph, fetch_size=chunk_size)
+        names = PersonNames(names)
+        sources, targets = dense_edges(node_ids, sources, targets)
+        del node_ids
+        if self.component_check:
+            self.components = ComponentIndex(names, sources, targets, version=version)
+        if self.path_engine == "memory":
+            self._path_graph = PathGraph(names, sources, targets, rel_ids, version=version)
+        self._graph_version = version
+        print(f"Loaded graph with {len(names)} people and {len(rel_ids)} relationships")
+
+    def refresh_graph(self):
+        """Load the in-memory graph structures, or reload them if the graph has been written to since."""
+        if self.path_engine != "memory" and not self.component_check:
+            return
+        if self._path_graph is not None or self.components is not None:
+            # One lookup of the version counter when nothing has changed
+            version = self._read(self._read_graph_version)
+            if version == self._graph_version:
+                return
+        self.load_graph()
+        # Another worker may have changed the graph
+        self.path_cache.clear()
+
+    @staticmethod
+    def _read_graph_version(tx):
+        record = tx.run("MATCH (s:SyncState {name: 'people'}) RETURN s.version AS version").single()
+        return record["version"] if record else None
 
-            relationship["relid"] = rel.id
-            relationships.append(relationship)
-        return {"names": names_list, "relationships": relationships}
+    def _note_graph_write(self, version):
+        """Record a graph version this process has committed."""
+        with self._stats_lock:
+            self._written_version = max(self._written_version, version)
+
+    @staticmethod
+    def _bump_graph_version(tx):
+        """
+        Claim the next graph version. The SyncState node stays locked until
+        commit, so versions become visible in order.
+        """
+        query = """
+        MERGE (s:SyncState {name: 'people'})
+        SET s.version = COALESCE(s.version, 0) + 1
+        RETURN s.version AS version
+        """
+        return tx.run(query).single()["version"]
 
     @staticmethod
     def _create_person_name_index(tx):
@@ -73,24 +548,235 @@ class PersonConnector:
         tx.run(query)
         print("Index check complete.")
 
-    def export_all_nodes(self, output_file="all_nodes.json"):
+    @staticmethod
+    def _create_person_version_index(tx):
+
+        print("Ensuring index on :Person(version)...")
+
+        query = "CREATE INDEX person_version_index IF NOT EXISTS FOR (n:Person) ON (n.version)"
+        tx.run(query)
+
+    @staticmethod
+    def _create_photo_asset_constraint(tx):
+
+        query = "CREATE CONSTRAINT photo_asset_id IF NOT EXISTS FOR (ph:Photo) REQUIRE ph.assetId IS UNIQUE"
+        tx.run(query)
+
+    @staticmethod
+    def _create_sync_state_constraint(tx):
+
+        query = "CREATE CONSTRAINT sync_state_name IF NOT EXISTS FOR (s:SyncState) REQUIRE s.name IS UNIQUE"
+        tx.run(query)
+
+    def export_all_nodes(self, output_file="all_nodes.json", snapshot_dir=None, max_edit_distance=2, chunk_size=5000):
+        """
+        Export every person to a JSON file, and optionally to a binary name snapshot.
+
+        Only the fields the app uses (id, name, name_cleaned, version) are fetched. Records
+        are streamed from Neo4j and written out in chunks as compact JSON, so the
+        full node list is never held in memory. The file is written under a
+        temporary name and renamed into place, so a concurrent load_all_nodes
+        only ever sees a complete export. The snapshot is only built when the
+        newest one in snapshot_dir has a different change marker, and only by
+        whichever process holds the directory's build lock.
+
+        Args:
+            output_file (str): JSON file to write
+            snapshot_dir (str): If set, also write a versioned, memory-mappable
+                name snapshot into this directory for the app workers to share
+            max_edit_distance (int): Edit-distance bound for the snapshot's typo index
+            chunk_size (int): Records fetched and written per batch
+        """
 
         print("Exporting nodes...")
-        query = "MATCH (n) RETURN n"
-        with self._driver.session(database="neo4j") as session:
-            result = session.run(query)
-            nodes = []
-            for record in result:
-                node = record["n"]
-                node_data = dict(node)
+        query = """
+        MATCH (n:Person)
+        RETURN id(n) AS id, n.name AS name, n.name_cleaned AS name_cleaned, n.version AS version
+        """
+        # (name, name_cleaned) pairs for the binary snapshot, only when one is wanted
+        names = [] if snapshot_dir else None
+
+        def export(tx, f):
+            # A retried transaction starts the file over
+            f.seek(0)
+            f.truncate()
+            if names is not None:
+                names.clear()
+            exported = 0
+            # Highest version in the export; incremental refreshes fetch changes after it
+            change_marker = 0
+            f.write("[")
+            chunk = []
+            for record in tx.run(query):
+                node_data = {"id": record["id"], "name": record["name"], "name_cleaned": record["name_cleaned"], "version": record["version"]}
+                change_marker = max(change_marker, record["version"] or 0)
+                chunk.append(json.dumps(node_data, separators=(",", ":")))
+                if names is not None:
+                    names.append((node_data["name"], node_data["name_cleaned"]))
+                if len(chunk) >= chunk_size:
+                    f.write(("," if exported else "") + ",".join(chunk))
+                    exported += len(chunk)
+                    chunk = []
+            if chunk:
+                f.write(("," if exported else "") + ",".join(chunk))
+                exported += len(chunk)
+            f.write("]")
+            return exported, change_marker
+
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_file)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                exported, change_marker = self._read(export, f, fetch_size=chunk_size)
+            os.replace(temp_file, output_file)
+        except Exception:
+            os.remove(temp_file)
+            raise
+
+        print(f"Exported {exported} nodes to {output_file}")
+
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+            # Every worker runs the export; only one builds the snapshot, and only when it changed
+            with open(os.path.join(snapshot_dir, SNAPSHOT_LOCK_FILE), "w") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    print("Name snapshot is being built by another process")
+                    return
+                if snapshot_is_current(snapshot_dir, change_marker, max_edit_distance):
+                    print(f"Name snapshot is already at change marker {change_marker}")
+                    return
+                snapshot = NameSnapshot(names, max_edit_distance=max_edit_distance, change_marker=change_marker)
+                del names
+                snapshot_path = write_versioned_snapshot(snapshot, snapshot_dir)
+            print(f"Wrote name snapshot {snapshot_path}")
+
+    def migrate_to_photos(self, batch_size=1000, delete_pairwise=False):
+        """
+        Convert pairwise IN_PICTURE_WITH relationships into the photo storage model.
+
+        Relationships are grouped by the id in their asset JSON: each asset
+        becomes one Photo holding the JSON and the summed ratings of its
+        relationships, and both people of every relationship APPEARS_IN it.
+        Converted relationships are marked, so an interrupted run can simply
+        be repeated; they are only removed when delete_pairwise is set, which
+        should wait until the app runs with storage_model="photo".
+
+        Args:
+            batch_size (int): Relationships converted or deleted per transaction
+            delete_pairwise (bool): Delete the converted relationships afterwards
 
+        Returns:
+            dict: relationshipsConverted, photosCreated and relationshipsDeleted counts
+        """
+        read_query = """
+        MATCH (a:Person)-[r:IN_PICTURE_WITH]->(b:Person)
+        WHERE r.photoMigrated IS NULL
+        RETURN id(r) AS relid, id(a) AS a, id(b) AS b, r.asset AS asset, COALESCE(r.rating, 0) AS rating
+        LIMIT $batch_size
+        """
+        write_query = """
+        UNWIND $rows AS row
+        MATCH (a) WHERE id(a) = row.a
+        MATCH (b) WHERE id(b) = row.b
+        MATCH ()-[r]->() WHERE id(r) = row.relid
+        MERGE (ph:Photo {assetId: row.asset_id})
+        ON CREATE SET ph.asset = row.asset, ph.rating = 0
+        SET ph.rating = ph.rating + row.rating, r.photoMigrated = true
+        MERGE (a)-[:APPEARS_IN]->(ph)
+        MERGE (b)-[:APPEARS_IN]->(ph)
+        """
+        delete_query = """
+        MATCH ()-[r:IN_PICTURE_WITH]->()
+        WHERE r.photoMigrated = true
+        WITH r LIMIT $batch_size
+        DELETE r
+        """
+        counts = {"relationshipsConverted": 0, "photosCreated": 0, "relationshipsDeleted": 0}
+        while True:
+            rows = []
+            for record in self._read_records(read_query, batch_size=batch_size):
+                try:
+                    asset_id = json.loads(record["asset"]).get("id")
+                except (TypeError, ValueError, AttributeError):
+                    asset_id = None
+                rows.append({
+                    "relid": record["relid"],
+                    "a": record["a"],
+                    "b": record["b"],
+                    "asset": record["asset"],
+                    "rating": record["rating"],
+                    # Assets without an id keep a Photo of their own
+                    "asset_id": str(asset_id) if asset_id else f"rel-{record['relid']}"
+                })
+            if not rows:
+                break
+            summary = self._write(lambda tx: tx.run(write_query, rows=rows).consume())
+            counts["relationshipsConverted"] += len(rows)
+            counts["photosCreated"] += summary.counters.nodes_created
+            print(f"Converted {counts['relationshipsConverted']} relationships...")
 
-                nodes.append(node_data)
+        while delete_pairwise:
+            summary = self._write(lambda tx: tx.run(delete_query, batch_size=batch_size).consume())
+            if not summary.counters.relationships_deleted:
+                break
+            counts["relationshipsDeleted"] += summary.counters.relationships_deleted
+            print(f"Deleted {counts['relationshipsDeleted']} pairwise relationships...")
 
-            with open(output_file, "w") as f:
-                json.dump(nodes, f, indent=4)
+        # Let every worker reload its in-memory graph
+        self._note_graph_write(self._write(self._bump_graph_version))
+        self.path_cache.clear()
+        return counts
 
-            print(f"Exported {len(nodes)} nodes to {output_file}")
+    def storage_stats(self):
+        """
+        Size of each storage model in the database.
+
+        Returns:
+            dict: Relationship, Photo and asset byte counts for the pairwise and photo models
+        """
+        pairwise_query = """
+        MATCH ()-[r:IN_PICTURE_WITH]->()
+        RETURN count(r) AS relationships, COALESCE(sum(size(r.asset)), 0) AS assetBytes
+        """
+        photo_query = """
+        MATCH (ph:Photo)
+        RETURN count(ph) AS photos, COALESCE(sum(size(ph.asset)), 0) AS assetBytes
+        """
+        appears_query = "MATCH ()-[r:APPEARS_IN]->() RETURN count(r) AS relationships"
+        pairwise, photos, appears = self._read(
+            lambda tx: [tx.run(query).single() for query in (pairwise_query, photo_query, appears_query)]
+        )
+        return {
+            "pairwise": {"relationships": pairwise["relationships"], "assetBytes": pairwise["assetBytes"]},
+            "photo": {
+                "photos": photos["photos"],
+                "relationships": appears["relationships"],
+                "assetBytes": photos["assetBytes"]
+            }
+        }
+
+    def get_changed_nodes(self, since):
+        """
+        Fetch the people added or changed after a change marker.
+
+        Every write that adds or renames a :Person stamps it with the next
+        value of the SyncState version counter, so this is one index lookup
+        and returns nothing at all when the graph has not changed.
+
+        Args:
+            since (int): Change marker of the snapshot in use
+
+        Returns:
+            list: Node dicts (id, name, name_cleaned, version), oldest change first
+        """
+        query = """
+        MATCH (n:Person)
+        WHERE n.version > $since
+        RETURN id(n) AS id, n.name AS name, n.name_cleaned AS name_cleaned, n.version AS version
+        ORDER BY version
+        """
+        return [record.data() for record in self._read_records(query, since=since)]
 
     def update_relationship_rating(self, relid, rating_value):
         """
@@ -98,43 +784,53 @@ class PersonConnector:
         If the property doesn't exist yet, it will be initialized to 0 before adding the rating.
 
         Args:
-            relid (str): The relationship ID to update
+            relid (str): The relationship ID to update, as handed out with paths
             rating_value (int): The rating value (1 for like, -1 for dislike)
 
         Returns:
             int or None: The new rating value after update, or None if the relationship wasn't found
         """
-
-        query = """
-        MATCH ()-[r]->()
-        WHERE id(r) = $relid
-        SET r.rating = COALESCE(r.rating, 0) + $rating_value
-        RETURN r.rating as new_rating, id(r) as rel_id
-        """
-
         try:
             print(f"Attempting to update relationship with ID: {relid}, rating: {rating_value}")
-            with self._driver.session(database="neo4j") as session:
+            int_id = self.parse_relid(relid)
+            if int_id is None:
+                print(f"Relationship ID '{relid}' is not a valid {self.storage_model} ID")
+                return None
 
-                try:
-                    int_id = int(relid)
-                    result = session.run(query, relid=int_id, rating_value=rating_value)
-
-
-                    records = list(result)
-                    if records:
-                        print(f"Successfully updated relationship {relid}, new rating: {records[0]['new_rating']}")
-                        return records[0]["new_rating"]
-                    else:
-                        print(f"No relationship found with ID: {relid}")
-                        return None
-                except ValueError:
-                    print(f"Relationship ID '{relid}' is not a valid integer")
-                    return None
+            new_rating = self.update_relationship_ratings({int_id: rating_value}).get(int_id)
+            if new_rating is not None:
+                print(f"Successfully updated relationship {relid}, new rating: {new_rating}")
+            else:
+                print(f"No relationship found with ID: {relid}")
+            return new_rating
         except Exception as e:
             print(f"Error updating relationship rating: {e}")
             return None
 
+    def update_relationship_ratings(self, deltas):
+        """
+        Add many rating changes in one write.
+
+        Args:
+            deltas (dict): Summed rating change by relationship id (int, from parse_relid)
+
+        Returns:
+            dict: New rating by relationship id, for every id that was found
+        """
+        query = f"""
+        UNWIND $updates AS update
+        MATCH {self._connection_pattern()}
+        WHERE id(r) = update.relid
+        SET r.rating = COALESCE(r.rating, 0) + update.delta
+        RETURN id(r) AS rel_id, r.rating AS new_rating
+        """
+        updates = [{"relid": relid, "delta": delta} for relid, delta in deltas.items()]
+        records = self._write(lambda tx: list(tx.run(query, updates=updates)))
+        ratings = {record["rel_id"]: record["new_rating"] for record in records}
+        for relid in ratings:
+            self.asset_cache.pop(relid)
+        return ratings
+
     def add_connection(self, people, is_new_person, asset):
         """
         Add a new connection between people in the database.
@@ -142,140 +838,191 @@ class PersonConnector:
         
         Args:
             people (list): List of person names
-            is_new_person (list): List of booleans indicating if the person is new
+            is_new_person (list): List of booleans indicating if the person is new.
+                People are merged on name either way, so a "new" person whose name
+                already exists is connected rather than duplicated
             asset (dict): The asset data (photo/connection info)
             
         Returns:
-            bool: True if successful, False otherwise
+            dict or bool: {"nodesCreated", "relationshipsCreated"} if successful, False otherwise
         """
         # Ensure we have at least 2 people
         if len(people) < 2:
             print("Need at least 2 people to create a connection")
             return False
-            
+
         try:
-            # Convert asset to JSON string
-            asset_json = json.dumps(asset)
-            
-            with self._driver.session(database="neo4j") as session:
-                # Create a transaction function
-                def create_connection(tx):
-                    # First, create or get all person nodes
-                    person_refs = []
-                    
-                    for i, person in enumerate(people):
-                        # Clean the name if needed (you might want to add a name cleaning function)
-                        cleaned_name = person.strip()
-                        
-                        if is_new_person[i]:
-                            # For new people, create a new node
-                            query = """
-                            CREATE (p:Person {name: $name, name_cleaned: $name_cleaned})
-                            RETURN p
-                            """
-                            result = tx.run(query, name=cleaned_name, name_cleaned=cleaned_name.split(" - ")[0])
-                            person_node = result.single()[0]
-                            person_refs.append(person_node)
-                        else:
-                            # For existing people, merge to avoid duplicates
-                            query = """
-                            MATCH (p:Person {name: $name})
-                            RETURN p
-                            """
-                            result = tx.run(query, name=cleaned_name)
-                            record = result.single()
-                            if record:
-                                person_refs.append(record[0])
-                            else:
-                                # Create if doesn't exist (shouldn't happen if properly validated)
-                                create_query = """
-                                CREATE (p:Person {name: $name, name_cleaned: $name_cleaned})
-                                RETURN p
-                                """
-                                create_result = tx.run(create_query, name=cleaned_name, name_cleaned=cleaned_name.split(" - ")[0])
-                                new_person = create_result.single()[0]
-                                person_refs.append(new_person)
-                    
-                    # Now create relationships between each person and all others
-                    for i in range(len(person_refs)):
-                        for j in range(i+1, len(person_refs)):
-                            # First check if relationship already exists between these people
-                            check_query = """
-                            MATCH (p1)-[r:IN_PICTURE_WITH]-(p2)
-                            WHERE id(p1) = $id1 AND id(p2) = $id2
-                            RETURN r
-                            """
-                            existing_rel = tx.run(
-                                check_query,
-                                id1=person_refs[i].id,
-                                id2=person_refs[j].id
-                            ).single()
-                            
-                            # Only create relationship if it doesn't exist
-                            if not existing_rel:
-                                query = """
-                                MATCH (p1) WHERE id(p1) = $id1
-                                MATCH (p2) WHERE id(p2) = $id2
-                                CREATE (p1)-[r:IN_PICTURE_WITH {asset: $asset, rating: 0}]->(p2)
-                                RETURN r
-                                """
-                                tx.run(
-                                    query, 
-                                    id1=person_refs[i].id, 
-                                    id2=person_refs[j].id, 
-                                    asset=asset_json
-                                )
-                            else:
-                                print(f"Relationship already exists between {i} and {j}, skipping creation.")
-                    
-                    return True
-                
-                # Execute the transaction
-                result = session.execute_write(create_connection)
-                return result
-                
+            return self.add_connections([(people, asset)])
         except Exception as e:
             print(f"Error adding connection: {e}")
             return False
 
+    def add_connections(self, connections):
+        """
+        Add many connections in one transaction.
+
+        The write takes three statements whatever the number of connections
+        and people: the graph version bump, one UNWIND that merges every
+        person on name, and one UNWIND that merges an IN_PICTURE_WITH
+        relationship for every pair in every connection or, in photo mode,
+        each asset's Photo and an APPEARS_IN for each person in it.
+
+        Args:
+            connections (list): (people, asset) tuples, each with at least 2 people
+
+        Returns:
+            dict: {"nodesCreated", "relationshipsCreated"} for the whole batch
+        """
+        assets = []
+        photos = []
+        person_rows = []
+        # Person row indexes of each connection
+        members = []
+        for people, asset in connections:
+            # Native copies of the projected fields, in asset_properties mode
+            asset_fields = (self._asset_fields(asset) or {"assetFields": False}) if self.asset_properties else {}
+            if self.storage_model == "photo":
+                # Photo nodes are merged on the asset id, which already fills assetId
+                asset_fields.pop("assetId", None)
+                photos.append({"asset_id": str(asset.get("id") or uuid.uuid4())})
+            assets.append({"json": json.dumps(asset), "fields": asset_fields})
+
+            indexes = []
+            for person in people:
+                # Clean the name if needed (you might want to add a name cleaning function)
+                name = person.strip()
+                indexes.append(len(person_rows))
+                person_rows.append({"index": len(person_rows), "name": name, "name_cleaned": name.split(" - ")[0]})
+            members.append(indexes)
+
+        def create_connections(tx):
+            # Claim the next change version for any person created below;
+            # versions become visible in order, so incremental refreshes miss none
+            version = self._bump_graph_version(tx)
+
+            # First, create or get all person nodes
+            people_query = """
+            UNWIND $people AS person
+            MERGE (p:Person {name: person.name})
+            ON CREATE SET p.name_cleaned = person.name_cleaned, p.version = $version
+            RETURN person.index AS index, id(p) AS id
+            """
+            result = tx.run(people_query, people=person_rows, version=version)
+            node_ids = {}
+            for record in result:
+                # Several existing nodes can share a name; connect the first
+                node_ids.setdefault(record["index"], record["id"])
+            nodes_created = result.consume().counters.nodes_created
+
+            if self.storage_model == "photo":
+                # One Photo per asset, which every person in it appears in
+                for photo, asset, indexes in zip(photos, assets, members):
+                    photo["asset"] = asset["json"]
+                    photo["fields"] = asset["fields"]
+                    photo["person_ids"] = sorted({node_ids[i] for i in indexes})
+                photo_query = """
+                UNWIND $photos AS photo
+                MERGE (ph:Photo {assetId: photo.asset_id})
+                ON CREATE SET ph.asset = photo.asset, ph.rating = 0, ph += photo.fields
+                WITH ph, photo
+                UNWIND photo.person_ids AS person_id
+                MATCH (p) WHERE id(p) = person_id
+                MERGE (p)-[:APPEARS_IN]->(ph)
+                """
+                summary = tx.run(photo_query, photos=photos).consume()
+                return version, {
+                    "nodesCreated": nodes_created + summary.counters.nodes_created,
+                    "relationshipsCreated": summary.counters.relationships_created
+                }
+
+            # Now connect each person to all others, skipping pairs already connected
+            pairs = [
+                [node_ids[indexes[i]], node_ids[indexes[j]], k]
+                for k, indexes in enumerate(members)
+                for i in range(len(indexes))
+                for j in range(i + 1, len(indexes))
+                if node_ids[indexes[i]] != node_ids[indexes[j]]
+            ]
+            pairs_query = """
+            UNWIND $pairs AS pair
+            MATCH (p1) WHERE id(p1) = pair[0]
+            MATCH (p2) WHERE id(p2) = pair[1]
+            WITH p1, p2, $assets[pair[2]] AS asset
+            MERGE (p1)-[r:IN_PICTURE_WITH]-(p2)
+            ON CREATE SET r.asset = asset.json, r.rating = 0, r += asset.fields
+            """
+            summary = tx.run(pairs_query, pairs=pairs, assets=assets).consume()
+            return version, {"nodesCreated": nodes_created, "relationshipsCreated": summary.counters.relationships_created}
+
+        # Execute the transaction
+        version, result = self._write(create_connections)
+        self._note_graph_write(version)
+        self.path_cache.clear()
+        if self.components is not None:
+            for people, _ in connections:
+                self.components.connect([person.strip() for person in people])
+        print(f"Added {len(connections)} connections: {result['nodesCreated']} people and {result['relationshipsCreated']} relationships created")
+        return result
+
     def delete_relationship(self, relid):
         """
         Delete a relationship by ID from Neo4j.
+        In photo mode the ID names a Photo, which is removed for everyone in it.
         
         Args:
-            relid (str): The relationship ID to delete
+            relid (str): The relationship ID to delete, as handed out with paths
             
         Returns:
             bool: True if successful, False otherwise
         """
-        query = """
-        MATCH ()-[r]->()
-        WHERE id(r) = $relid
-        DELETE r
-        RETURN count(r) as deleted_count
-        """
-        
         try:
             print(f"Attempting to delete relationship with ID: {relid}")
-            with self._driver.session(database="neo4j") as session:
-                try:
-                    int_id = int(relid)
-                    result = session.run(query, relid=int_id)
-                    
-                    summary = result.consume()
-                    if summary.counters.relationships_deleted > 0:
-                        print(f"Successfully deleted relationship {relid}")
-                        return True
-                    else:
-                        print(f"No relationship found with ID: {relid}")
-                        return False
-                except ValueError:
-                    print(f"Relationship ID '{relid}' is not a valid integer")
-                    return False
+            int_id = self.parse_relid(relid)
+            if int_id is None:
+                print(f"Relationship ID '{relid}' is not a valid {self.storage_model} ID")
+                return False
+
+            if self.delete_relationships([int_id]):
+                print(f"Successfully deleted relationship {relid}")
+                return True
+            print(f"No relationship found with ID: {relid}")
+            return False
         except Exception as e:
             print(f"Error deleting relationship: {e}")
             return False
 
+    def delete_relationships(self, relids):
+        """
+        Delete many relationships (or Photos, in photo mode) in one transaction.
+
+        Args:
+            relids (list): Relationship ids (int, from parse_relid)
+
+        Returns:
+            set: The ids that were found and deleted
+        """
+        query = f"""
+        UNWIND $relids AS relid
+        MATCH {self._connection_pattern()}
+        WHERE id(r) = relid
+        WITH r, id(r) AS rel_id
+        {"DETACH DELETE" if self.storage_model == "photo" else "DELETE"} r
+        RETURN rel_id
+        """
+
+        def delete(tx):
+            deleted = {record["rel_id"] for record in tx.run(query, relids=list(relids))}
+            version = self._bump_graph_version(tx) if deleted else None
+            return deleted, version
+
+        deleted, version = self._write(delete)
+        if deleted:
+            self._note_graph_write(version)
+            self.path_cache.clear()
+            for relid in deleted:
+                self.asset_cache.pop(relid)
+        return deleted
+
 
 
 
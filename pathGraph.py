@@ -0,0 +1,260 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import threading
+
+import numpy as np
+
+from nameIndex import StringTable, _SortedKeys
+
+
+class PersonNames:
+    """
+    Name of every person in a graph load, numbered densely in export order.
+
+    Names live in a StringTable with a sorted order for exact lookups, so
+    PathGraph and ComponentIndex can share one copy.
+    """
+
+    def __init__(self, names):
+        """
+        Args:
+            names (list): Name of every person
+        """
+        self._table = StringTable(names)
+        self._order = array('i', sorted(range(len(names)), key=names.__getitem__))
+        self._keys = _SortedKeys(self._table, self._order)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __getitem__(self, index):
+        return self._table[index]
+
+    def find(self, name):
+        """Return the indexes of every person with exactly this name."""
+        lo = bisect_left(self._keys, name)
+        hi = bisect_right(self._keys, name, lo)
+        return np.array(self._order[lo:hi], dtype=np.int32)
+
+
+def dense_edges(node_ids, sources, targets):
+    """
+    Map the Neo4j ids of relationship endpoints to person indexes.
+
+    Args:
+        node_ids (array): Neo4j id of every person, in PersonNames order
+        sources (array): Neo4j id of each relationship's start person
+        targets (array): Neo4j id of each relationship's end person
+
+    Returns:
+        tuple: (sources, targets) as person index arrays
+    """
+    node_ids = np.frombuffer(node_ids, dtype=np.int64)
+    id_order = np.argsort(node_ids, kind='stable')
+    sorted_ids = node_ids[id_order]
+    sources = id_order[np.searchsorted(sorted_ids, np.frombuffer(sources, dtype=np.int64))]
+    targets = id_order[np.searchsorted(sorted_ids, np.frombuffer(targets, dtype=np.int64))]
+    return sources.astype(np.int32), targets.astype(np.int32)
+
+
+class PathGraph:
+    """
+    Compact in-memory copy of the :Person / IN_PICTURE_WITH graph.
+
+    Relationships are stored in CSR form, once in each direction since paths
+    ignore direction: the neighbours of person i are
+    neighbors[offsets[i]:offsets[i + 1]], and rel_ids holds the Neo4j id of
+    the relationship behind each entry. Like a NameSnapshot, a PathGraph is
+    never modified; a reload builds a new one.
+    """
+
+    def __init__(self, names, sources, targets, rel_ids, version=None):
+        """
+        Args:
+            names (PersonNames): Every person in the graph
+            sources (numpy.ndarray): Start person index of each relationship
+            targets (numpy.ndarray): End person index of each relationship
+            rel_ids (array): Neo4j id of each relationship
+            version (int): Graph version counter the graph was read at
+        """
+        self.version = version
+        self.names = names
+        rel_ids = np.frombuffer(rel_ids, dtype=np.int64)
+
+        # Both directions of every relationship, grouped by the person they start from
+        starts = np.concatenate((sources, targets))
+        order = np.argsort(starts, kind='stable')
+        self._neighbors = np.concatenate((targets, sources))[order]
+        self._rel_ids = np.concatenate((rel_ids, rel_ids))[order]
+        self._offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(starts, minlength=len(names)), out=self._offsets[1:])
+
+    def __len__(self):
+        return len(self.names)
+
+    def _expand(self, frontier):
+        """Every (neighbour, person it was reached from, relationship id) entry of the frontier."""
+        starts = self._offsets[frontier]
+        counts = self._offsets[frontier + 1] - starts
+        positions = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        return self._neighbors[positions], np.repeat(frontier, counts), self._rel_ids[positions]
+
+    @staticmethod
+    def _trace(levels, node, level):
+        """Follow parents from node at level back to a start person."""
+        nodes = [node]
+        rel_ids = []
+        for depth in range(level, 0, -1):
+            level_nodes, parents, level_rel_ids = levels[depth]
+            i = np.searchsorted(level_nodes, node)
+            rel_ids.append(int(level_rel_ids[i]))
+            node = int(parents[i])
+            nodes.append(node)
+        return nodes, rel_ids
+
+    def shortest_path(self, sources, targets, max_depth=10):
+        """
+        Find a shortest path from any of sources to any of targets.
+
+        Runs a breadth-first search from both ends at once, always growing the
+        smaller frontier by a whole level, and stops at the first level where
+        the two searches meet. Per-query state is two byte arrays holding each
+        person's level on either side, plus the levels themselves.
+
+        Args:
+            sources (numpy.ndarray): Start person indexes
+            targets (numpy.ndarray): End person indexes
+            max_depth (int): Longest path, in relationships, worth finding
+
+        Returns:
+            tuple: (person indexes, relationship ids) from a source to a
+                target, or None if no path of at most max_depth exists
+        """
+        if not len(sources) or not len(targets):
+            return None
+        # Level + 1 of every person reached from each end; 0 means unreached
+        reached = (np.zeros(len(self), dtype=np.int8), np.zeros(len(self), dtype=np.int8))
+        levels = ([(np.unique(sources), None, None)], [(np.unique(targets), None, None)])
+        reached[0][sources] = 1
+        reached[1][targets] = 1
+        common = np.flatnonzero(reached[1][sources])
+        if len(common):
+            return [int(sources[common[0]])], []
+
+        while len(levels[0]) + len(levels[1]) - 2 < max_depth:
+            side = 0 if len(levels[0][-1][0]) <= len(levels[1][-1][0]) else 1
+            other = 1 - side
+            nodes, parents, rel_ids = self._expand(levels[side][-1][0])
+            fresh = reached[side][nodes] == 0
+            nodes, first = np.unique(nodes[fresh], return_index=True)
+            if not len(nodes):
+                return None
+            parents = parents[fresh][first]
+            rel_ids = rel_ids[fresh][first]
+            reached[side][nodes] = len(levels[side]) + 1
+            levels[side].append((nodes, parents, rel_ids))
+
+            met = reached[other][nodes]
+            hits = np.flatnonzero(met)
+            if len(hits):
+                # Closest to the other end gives the shortest total path
+                meet = int(nodes[hits[np.argmin(met[hits])]])
+                halves = [None, None]
+                halves[side] = self._trace(levels[side], meet, len(levels[side]) - 1)
+                halves[other] = self._trace(levels[other], meet, int(reached[other][meet]) - 1)
+                (source_nodes, source_rels), (target_nodes, target_rels) = halves
+                return source_nodes[::-1] + target_nodes[1:], source_rels[::-1] + target_rels
+        return None
+
+
+def _component_labels(count, sources, targets):
+    """
+    Label every person with the smallest person index in its connected component.
+
+    Repeatedly hooks the root of each relationship's larger label onto the
+    smaller one, then compresses every label straight to its root, until
+    both ends of every relationship share a label.
+    """
+    labels = np.arange(count, dtype=np.int32)
+    while True:
+        low = np.minimum(labels[sources], labels[targets])
+        np.minimum.at(labels, labels[sources], low)
+        np.minimum.at(labels, labels[targets], low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels[sources], labels[targets]):
+            return labels
+
+
+class ComponentIndex:
+    """
+    Connected-component label of every person, so a pair in different
+    components - or a name the graph has never seen - can be answered
+    "no path" without a traversal.
+
+    Labels are computed once per graph load. Connections made afterwards in
+    this process are recorded by connect(), which merges the components
+    involved through a small union-find over labels and gives new people
+    labels of their own. Deleted relationships never split a component
+    until the next load, which only ever errs towards running the query.
+    """
+
+    def __init__(self, names, sources, targets, version=None):
+        """
+        Args:
+            names (PersonNames): Every person in the graph
+            sources (numpy.ndarray): Start person index of each relationship
+            targets (numpy.ndarray): End person index of each relationship
+            version (int): Graph version counter the graph was read at
+        """
+        self.version = version
+        self.names = names
+        self._labels = _component_labels(len(names), sources, targets)
+        self.component_count = len(np.unique(self._labels))
+        # Union-find parents of merged labels, and labels of people added since the load
+        self._parents = {}
+        self._added = {}
+        self._next_label = len(names)
+        self._lock = threading.Lock()
+
+    def _root(self, label):
+        root = label
+        while root in self._parents:
+            root = self._parents[root]
+        while label != root:
+            self._parents[label], label = root, self._parents[label]
+        return root
+
+    def _roots(self, name):
+        """Component roots of every person called name; empty if there is none. Caller holds the lock."""
+        labels = set(self._labels[self.names.find(name)].tolist())
+        labels.update(self._added.get(name, ()))
+        return {self._root(label) for label in labels}
+
+    def connected(self, person1, person2):
+        """Whether a person called person1 and one called person2 share a component."""
+        with self._lock:
+            return not self._roots(person1).isdisjoint(self._roots(person2))
+
+    def connect(self, people):
+        """
+        Record that people were just connected, adding any that are new.
+
+        Args:
+            people (list): Names of the people in the new connection
+        """
+        with self._lock:
+            roots = set()
+            for person in people:
+                person_roots = self._roots(person)
+                if not person_roots:
+                    person_roots = {self._next_label}
+                    self._added.setdefault(person, set()).add(self._next_label)
+                    self._next_label += 1
+                roots |= person_roots
+            roots = sorted(roots)
+            for root in roots[1:]:
+                self._parents[root] = roots[0]
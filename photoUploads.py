@@ -0,0 +1,183 @@
+import os
+import queue
+import threading
+import time
+
+
+class UploadTooLarge(Exception):
+    """An uploaded file went over the size limit."""
+
+    def __init__(self, max_bytes):
+        super().__init__(f"Upload is larger than {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+def read_limited(stream, max_bytes, chunk_size=65536):
+    """
+    Read a file stream into memory, stopping as soon as it goes over max_bytes.
+
+    Args:
+        stream: Readable binary stream, e.g. a werkzeug FileStorage.stream
+        max_bytes (int): Largest size accepted
+        chunk_size (int): Bytes read at a time
+
+    Returns:
+        bytes: The file contents
+
+    Raises:
+        UploadTooLarge: The stream holds more than max_bytes
+    """
+    data = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return bytes(data)
+        data += chunk
+        if len(data) > max_bytes:
+            raise UploadTooLarge(max_bytes)
+
+
+class _Upload:
+    def __init__(self, filename, data, content_type, on_fallback):
+        self.filename = filename
+        self.data = data
+        self.content_type = content_type
+        self.on_fallback = on_fallback
+
+
+class PhotoUploader:
+    """
+    Uploads photos to a Supabase Storage bucket, retrying failed attempts.
+
+    Files whose every attempt fails are written to fallback_dir instead,
+    from the bytes already in memory. With workers > 0, submit() queues
+    the upload for background threads and returns at once; the queue is
+    bounded by max_queue and, when it is full, the caller uploads itself.
+    close() waits for the queue to drain.
+    """
+
+    def __init__(self, storage, bucket, workers=0, max_queue=100, retries=3, backoff=0.5, fallback_dir="uploads"):
+        """
+        Args:
+            storage: Supabase storage client (supabase.storage)
+            bucket (str): Bucket the photos go to
+            workers (int): Background upload threads; 0 uploads in the caller's thread
+            max_queue (int): Most uploads waiting for a background thread
+            retries (int): Attempts per upload
+            backoff (float): Seconds before the first retry, doubling after each
+            fallback_dir (str): Directory for photos that could not be uploaded
+        """
+        self.storage = storage
+        self.bucket = bucket
+        self.retries = retries
+        self.backoff = backoff
+        self.fallback_dir = fallback_dir
+        self._queue = queue.Queue(maxsize=max_queue) if workers else None
+        self._threads = [
+            threading.Thread(target=self._run, name=f"photo-upload-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._lock = threading.Lock()
+        self.uploaded = 0
+        self.failed = 0
+        self.retried = 0
+        self.inline = 0
+
+    @property
+    def background(self):
+        return self._queue is not None
+
+    def public_url(self, filename):
+        """URL a photo will be served from once uploaded."""
+        return self.storage.from_(self.bucket).get_public_url(filename)
+
+    def submit(self, filename, data, content_type, on_fallback=None):
+        """
+        Upload a photo, in the background if there are workers.
+
+        Args:
+            filename (str): Path of the photo in the bucket
+            data (bytes): Photo contents
+            content_type (str): MIME type of the photo
+            on_fallback (callable): Called with the local path if the photo
+                could not be uploaded and was written to fallback_dir instead
+
+        Returns:
+            str: Public URL, or the local path if an upload made here failed
+        """
+        upload = _Upload(filename, data, content_type, on_fallback)
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(upload)
+                return self.public_url(filename)
+            except queue.Full:
+                with self._lock:
+                    self.inline += 1
+        return self._upload(upload)
+
+    def _upload(self, upload):
+        for attempt in range(self.retries):
+            try:
+                self.storage.from_(self.bucket).upload(
+                    path=upload.filename,
+                    file=upload.data,
+                    file_options={"content-type": upload.content_type}
+                )
+                with self._lock:
+                    self.uploaded += 1
+                return self.public_url(upload.filename)
+            except Exception as e:
+                print(f"Error uploading {upload.filename} to Supabase (attempt {attempt + 1}): {e}")
+                if attempt + 1 < self.retries:
+                    with self._lock:
+                        self.retried += 1
+                    time.sleep(self.backoff * 2 ** attempt)
+
+        # Fallback to local storage if Supabase upload fails
+        with self._lock:
+            self.failed += 1
+        os.makedirs(self.fallback_dir, exist_ok=True)
+        filepath = os.path.join(self.fallback_dir, upload.filename)
+        with open(filepath, 'wb') as f:
+            f.write(upload.data)
+        if upload.on_fallback is not None:
+            try:
+                upload.on_fallback(filepath)
+            except Exception as e:
+                print(f"Error recording fallback path {filepath}: {e}")
+        return filepath
+
+    def _run(self):
+        while True:
+            upload = self._queue.get()
+            try:
+                if upload is None:
+                    return
+                self._upload(upload)
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        """Finish every queued upload and stop the background threads."""
+        if self._queue is None:
+            return
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._queue = None
+
+    def stats(self):
+        """Queue length and upload counters."""
+        with self._lock:
+            return {
+                "background": self.background,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "uploaded": self.uploaded,
+                "retried": self.retried,
+                "failed": self.failed,
+                "inline": self.inline
+            }
@@ -0,0 +1,194 @@
+import threading
+
+from lruCache import LRUCache
+
+
+class _Batch:
+    """Rating changes collected between two flushes."""
+
+    def __init__(self):
+        self.deltas = {}
+        self.events = 0
+        self.results = {}
+        self.error = None
+        self.done = threading.Event()
+
+
+class RatingCoalescer:
+    """
+    Sums rating changes per relationship in memory and writes them together.
+
+    A background thread flushes the pending changes every flush_interval
+    seconds, or as soon as max_events have arrived, as one write of the
+    summed change of every relationship touched. How long add() waits is
+    set by durability:
+
+    - "direct": no buffering; every change is its own write.
+    - "group": add() returns once the flush holding its change has been
+      written, with the relationship's new total. Changes are durable
+      before the caller hears back, and a failed flush is reported to
+      every caller in it.
+    - "async": add() returns an optimistic total - the last written total
+      plus the changes still pending - without waiting. Only the first
+      change to a relationship this process has not written yet waits,
+      which is also how unknown relationships are still reported as not
+      found. A failed flush is retried with the next one; changes still
+      pending when the process dies are lost.
+
+    close() stops the thread and, with flush_on_shutdown, writes out what
+    is still pending.
+    """
+
+    def __init__(self, write, flush_interval=0.1, max_events=500, durability="group", flush_on_shutdown=True,
+                 total_cache_size=65536):
+        """
+        Args:
+            write (callable): Takes {relid: summed change} and returns {relid: new total}
+                for every relationship found, e.g. PersonConnector.update_relationship_ratings
+            flush_interval (float): Seconds between flushes
+            max_events (int): Pending changes that trigger a flush before the interval is up
+            durability (str): "direct", "group" or "async", see above
+            flush_on_shutdown (bool): Write out pending changes in close()
+            total_cache_size (int): Most written totals remembered for async answers
+        """
+        if durability not in ("direct", "group", "async"):
+            raise ValueError(f"Unknown rating durability: {durability}")
+        self._write = write
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.durability = durability
+        self.flush_on_shutdown = flush_on_shutdown
+        # Last written total by relationship id
+        self._totals = LRUCache(maxsize=total_cache_size)
+        self._batch = _Batch()
+        # Batch being written, whose changes still count towards optimistic totals
+        self._flushing = None
+        self._closed = durability == "direct"
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self.events = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self._thread = None
+        if not self._closed:
+            self._thread = threading.Thread(target=self._run, name="rating-coalescer", daemon=True)
+            self._thread.start()
+
+    def add(self, relid, delta):
+        """
+        Record a rating change.
+
+        Args:
+            relid (int): Relationship id
+            delta (int): Change to its rating
+
+        Returns:
+            int or None: The relationship's new total, or None if it was not found
+        """
+        with self._cond:
+            if self._closed:
+                batch = None
+            else:
+                batch = self._batch
+                batch.deltas[relid] = batch.deltas.get(relid, 0) + delta
+                batch.events += 1
+                self.events += 1
+                total = self._totals.peek(relid) if self.durability == "async" else None
+                if total is not None:
+                    total += batch.deltas[relid]
+                    if self._flushing is not None:
+                        total += self._flushing.deltas.get(relid, 0)
+                if batch.events >= self.max_events:
+                    self._cond.notify()
+        if batch is None:
+            return self._write({relid: delta}).get(relid)
+        if total is not None:
+            return total
+
+        batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return batch.results.get(relid)
+
+    def flush(self):
+        """
+        Write every pending change now.
+
+        Returns:
+            int: Relationships written
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch = self._batch
+                if not batch.deltas:
+                    return 0
+                self._batch = _Batch()
+                self._flushing = batch
+            try:
+                results = self._write(batch.deltas)
+            except Exception as e:
+                print(f"Error flushing rating changes: {e}")
+                self.failed_flushes += 1
+                batch.error = e
+                with self._cond:
+                    self._flushing = None
+                    if self.durability == "async":
+                        # Callers were already answered, so keep the changes for the next flush
+                        for relid, delta in batch.deltas.items():
+                            self._batch.deltas[relid] = self._batch.deltas.get(relid, 0) + delta
+                return 0
+            else:
+                batch.results = results
+                with self._cond:
+                    for relid in batch.deltas:
+                        if relid in results:
+                            self._totals.put(relid, results[relid])
+                        else:
+                            self._totals.pop(relid)
+                    self._flushing = None
+                self.flushes += 1
+                return len(batch.deltas)
+            finally:
+                batch.done.set()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or self._batch.events >= self.max_events,
+                    timeout=self.flush_interval
+                )
+                closed = self._closed
+            if closed:
+                return
+            self.flush()
+
+    def close(self):
+        """Stop flushing in the background; later changes are written directly."""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+        if self.flush_on_shutdown:
+            self.flush()
+        else:
+            with self._cond:
+                batch, self._batch = self._batch, _Batch()
+            # Nothing will write these changes; release anyone waiting on them
+            batch.error = RuntimeError("Rating coalescer closed before the change was written")
+            batch.done.set()
+
+    def stats(self):
+        """Pending changes and flush counters."""
+        with self._cond:
+            return {
+                "durability": self.durability,
+                "pending": len(self._batch.deltas),
+                "pendingEvents": self._batch.events,
+                "events": self.events,
+                "flushes": self.flushes,
+                "failedFlushes": self.failed_flushes
+            }
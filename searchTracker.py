@@ -0,0 +1,221 @@
+from datetime import datetime
+import itertools
+import threading
+import time
+
+from lruCache import LRUCache
+
+
+class SearchTracker:
+    """
+    Write-behind counter of path searches per pair of people.
+
+    record() only adds to an in-memory aggregate of pending searches, so the
+    request path makes no Supabase calls once a pair's stored count is known.
+    flush() writes every pending pair at once with one call of the function
+    in sql/connection_searches.sql, which adds the counts on the server in a
+    single upsert, so concurrent flushes from several workers neither lose
+    increments nor duplicate rows. Counts are served as the last stored
+    count plus whatever this process has recorded since; stored counts are
+    re-read after base_ttl seconds, which bounds how long other workers'
+    searches go unseen.
+
+    Pending searches are bounded by max_pending distinct pairs; recording a
+    new pair beyond that flushes in the caller's thread. A failed flush puts
+    its searches back to be retried with the next one, and for
+    retry_backoff seconds afterwards (doubling with each further failure,
+    up to max_retry_backoff) record() does not force flushes. While a flush
+    is running or backing off, the oldest pending pairs are dropped instead,
+    so an outage neither grows the buffer nor stalls requests.
+    """
+
+    def __init__(self, client, table="connection_searches", function="increment_connection_searches",
+                 max_pending=10000, base_size=65536, base_ttl=600, select_chunk_size=50,
+                 retry_backoff=5, max_retry_backoff=300):
+        """
+        Args:
+            client: Supabase client
+            table (str): Table holding person1, person2, count, first_searched and last_searched
+            function (str): Database function adding a batch of counts, see sql/connection_searches.sql
+            max_pending (int): Most distinct pairs buffered before a flush is forced
+            base_size (int): Most stored counts kept in memory
+            base_ttl (float): Seconds before a stored count is read again
+            select_chunk_size (int): Most pairs looked up per select
+            retry_backoff (float): Seconds after a failed flush before record() forces another
+            max_retry_backoff (float): Longest backoff after repeated failures
+        """
+        self.client = client
+        self.table = table
+        self.function = function
+        self.max_pending = max_pending
+        self.select_chunk_size = select_chunk_size
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        # Last stored count by sorted pair
+        self._base = LRUCache(maxsize=base_size, ttl=base_ttl)
+        # (searches, first searched, last searched) by sorted pair, not yet written
+        self._pending = {}
+        # Searches taken by the flush in progress, still counted until written
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Current backoff, and the monotonic time before which record() does not flush
+        self._backoff = retry_backoff
+        self._retry_at = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped_searches = 0
+
+    def _select(self, keys):
+        """Stored count of every key that has a row."""
+        keys = sorted(keys)
+        counts = {}
+        for start in range(0, len(keys), self.select_chunk_size):
+            chunk = keys[start:start + self.select_chunk_size]
+            # Rows matching both name lists, narrowed to the exact pairs below; chunks
+            # of sorted pairs keep the URL and the rows of that cross product small
+            response = self.client.table(self.table).select("person1, person2, count") \
+                .in_("person1", sorted({key[0] for key in chunk})) \
+                .in_("person2", sorted({key[1] for key in chunk})).execute()
+            wanted = set(chunk)
+            for row in response.data or []:
+                key = (row["person1"], row["person2"])
+                if key in wanted:
+                    counts[key] = row.get("count") or 0
+        return counts
+
+    def record(self, pairs):
+        """
+        Count a search of each pair and return each pair's count so far.
+
+        Pairs whose stored count this process has not seen yet are looked
+        up together, select_chunk_size pairs per select; if that fails their
+        counts start from what this process has recorded.
+
+        Args:
+            pairs (list): (person1, person2) tuples, in either order
+
+        Returns:
+            list: Count of each pair including this search
+        """
+        if not pairs:
+            return []
+        # Sort names alphabetically for consistent entry
+        keys = [tuple(sorted(pair)) for pair in pairs]
+        bases = {key: self._base.get(key) for key in set(keys)}
+        unknown = {key for key, base in bases.items() if base is None}
+        if unknown:
+            try:
+                stored = self._select(unknown)
+            except Exception as e:
+                print(f"Error reading search counts from Supabase: {e}")
+                stored = None
+            for key in unknown:
+                bases[key] = stored.get(key, 0) if stored is not None else 0
+                if stored is not None:
+                    self._base.put(key, bases[key])
+
+        now = datetime.now().isoformat()
+        with self._lock:
+            counts = []
+            for key in keys:
+                searches, first_searched, _ = self._pending.get(key, (0, now, None))
+                self._pending[key] = (searches + 1, first_searched, now)
+                # A flush may have stored more since the count was read
+                base = self._base.peek(key, bases[key])
+                counts.append(base + searches + 1 + self._flushing.get(key, (0,))[0])
+            full = len(self._pending) > self.max_pending
+            if full and time.monotonic() < self._retry_at:
+                # Supabase failed recently; stay within the bound instead of retrying here
+                self._trim()
+                full = False
+        if full and not self.flush(wait=False):
+            # Another flush is still running, or this one failed; stay within the bound meanwhile
+            with self._lock:
+                self._trim()
+        return counts
+
+    def _trim(self):
+        """Drop the oldest pending pairs beyond max_pending. Called with _lock held."""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            for key in list(itertools.islice(self._pending, excess)):
+                self.dropped_searches += self._pending.pop(key)[0]
+
+    def flush(self, wait=True):
+        """
+        Write every pending search to Supabase.
+
+        Args:
+            wait (bool): Wait for a flush already in progress; otherwise return at once
+
+        Returns:
+            int: Pairs written
+        """
+        if not self._flush_lock.acquire(blocking=wait):
+            return 0
+        try:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._flushing, self._pending = self._pending, {}
+            batch = self._flushing
+            searches = [
+                {
+                    "person1": key[0],
+                    "person2": key[1],
+                    "count": count,
+                    "first_searched": first_searched,
+                    "last_searched": last_searched
+                }
+                for key, (count, first_searched, last_searched) in batch.items()
+            ]
+            try:
+                # Adds to the stored counts on the server and returns the new rows
+                response = self.client.rpc(self.function, {"searches": searches}).execute()
+            except Exception as e:
+                print(f"Error flushing search counts to Supabase: {e}")
+                self.failed_flushes += 1
+                with self._lock:
+                    # Retry with the next flush, ahead of anything recorded meanwhile
+                    merged = dict(batch)
+                    for key, (count, first_searched, last_searched) in self._pending.items():
+                        if key in merged:
+                            count += merged[key][0]
+                            first_searched = merged[key][1]
+                        merged[key] = (count, first_searched, last_searched)
+                    self._pending = merged
+                    self._trim()
+                    self._flushing = {}
+                    self._retry_at = time.monotonic() + self._backoff
+                    self._backoff = min(self._backoff * 2, self.max_retry_backoff)
+                return 0
+
+            stored = {(row["person1"], row["person2"]): row["count"] for row in response.data or []}
+            with self._lock:
+                for key in batch:
+                    if key in stored:
+                        self._base.put(key, stored[key])
+                    else:
+                        # Not reported back; read it again rather than lose this batch's searches
+                        self._base.pop(key)
+                self._flushing = {}
+                self._backoff = self.retry_backoff
+                self._retry_at = 0
+            self.flushes += 1
+            return len(batch)
+        finally:
+            self._flush_lock.release()
+
+    def stats(self):
+        """Buffer size and flush counters."""
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "pendingSearches": sum(entry[0] for entry in self._pending.values()),
+                "knownPairs": len(self._base),
+                "maxPending": self.max_pending,
+                "flushes": self.flushes,
+                "failedFlushes": self.failed_flushes,
+                "droppedSearches": self.dropped_searches
+            }
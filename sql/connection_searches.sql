@@ -0,0 +1,39 @@
+-- Server side of SearchTracker: one row per pair of people, incremented atomically.
+-- Run in the Supabase SQL editor; every statement is safe to run again.
+
+-- Merge rows duplicated by concurrent inserts into the oldest one
+with merged as (
+    select min(id) as keep_id, person1, person2,
+        sum(c.count) as count, min(first_searched) as first_searched, max(last_searched) as last_searched
+    from connection_searches c
+    group by person1, person2
+    having count(*) > 1
+)
+update connection_searches c
+set count = m.count, first_searched = m.first_searched, last_searched = m.last_searched
+from merged m
+where c.id = m.keep_id;
+
+delete from connection_searches c
+using connection_searches d
+where c.person1 = d.person1 and c.person2 = d.person2 and c.id > d.id;
+
+create unique index if not exists connection_searches_pair_key on connection_searches (person1, person2);
+
+-- Add a batch of search counts, creating rows as needed, and return the stored rows.
+-- searches: [{"person1", "person2", "count", "first_searched", "last_searched"}, ...]
+-- with each (person1, person2) pair at most once.
+create or replace function increment_connection_searches(searches jsonb)
+returns setof connection_searches
+language sql
+as $$
+    insert into connection_searches as s (person1, person2, count, first_searched, last_searched)
+    select r.person1, r.person2, r.count, r.first_searched, r.last_searched
+    from jsonb_to_recordset(searches)
+        as r(person1 text, person2 text, count integer, first_searched timestamptz, last_searched timestamptz)
+    on conflict (person1, person2) do update
+    set count = s.count + excluded.count,
+        first_searched = least(s.first_searched, excluded.first_searched),
+        last_searched = greatest(s.last_searched, excluded.last_searched)
+    returning s.*;
+$$;
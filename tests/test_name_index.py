@@ -0,0 +1,91 @@
+import random
+
+import pytest
+from rapidfuzz import fuzz, process
+
+from nameIndex import NameSnapshot
+
+FIRST_NAMES = """
+James Mary Robert Patricia John Jennifer Michael Linda David Elizabeth William Barbara Richard Susan Joseph
+Jessica Thomas Sarah Charles Karen Christopher Lisa Daniel Nancy Matthew Betty Anthony Margaret Mark Sandra
+Donald Ashley Steven Kimberly Paul Emily Andrew Donna Joshua Michelle Kenneth Carol Kevin Amanda Brian Dorothy
+George Melissa Timothy Deborah Ronald Stephanie Edward Rebecca Jason Sharon Jeffrey Laura Ryan Cynthia Jacob
+Kathleen Gary Amy Nicholas Angela Eric Shirley Jonathan Anna Stephen Brenda Larry Pamela Justin Emma Scott
+Nicole Brandon Helen Benjamin Samantha Samuel Katherine Gregory Christine Alexander Debra Frank Rachel Patrick
+Carolyn Raymond Janet Jack Catherine Dennis Maria Jerry Heather Tyler Diane
+""".split()
+LAST_NAMES = """
+Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Hernandez Lopez Gonzalez Wilson
+Anderson Thomas Taylor Moore Jackson Martin Lee Perez Thompson White Harris Sanchez Clark Ramirez Lewis Robinson
+Walker Young Allen King Wright Scott Torres Nguyen Hill Flores Green Adams Nelson Baker Hall Rivera Campbell
+Mitchell Carter Roberts Gomez Phillips Evans Turner Diaz Parker Cruz Edwards Collins Reyes Stewart Morris Morales
+Murphy Cook Rogers Gutierrez Ortiz Morgan Cooper Peterson Bailey Reed Kelly Howard Ramos Kim Cox Ward Richardson
+Watson Brooks Chavez Wood James Bennett Gray Mendoza Ruiz Hughes Price Alvarez Castillo Sanders Patel Myers Long
+Ross Foster Jimenez
+""".split()
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def synthetic_names(rng, count):
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}")
+    return sorted(names)
+
+
+def misspell(rng, name):
+    """One or two typos (substitution, deletion, insertion or swap) inside the words of name."""
+    chars = list(name.lower())
+    for _ in range(rng.randint(1, 2)):
+        i = rng.choice([j for j, char in enumerate(chars) if char != " "])
+        typo = rng.choice("sdit")
+        if typo == "s":
+            chars[i] = rng.choice(LETTERS)
+        elif typo == "d" and len(chars) > 4:
+            del chars[i]
+        elif typo == "i":
+            chars.insert(i, rng.choice(LETTERS))
+        elif typo == "t" and i + 1 < len(chars) and chars[i + 1] != " ":
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return "".join(chars)
+
+
+def fuzzy_fallback(query, names, limit=10, cutoff=40):
+    """The WRatio step of app.fuzzy_search_people, with its relevance filter."""
+    query_lower = query.lower()
+    query_words = [word for word in query_lower.split() if len(word) > 1]
+    results = []
+    for name, score, _ in process.extract(query, names, scorer=fuzz.WRatio, limit=limit * 2, score_cutoff=cutoff):
+        name_lower = name.lower()
+        if name_lower.startswith(query_lower):
+            continue
+        if not any(word in name_lower for word in query_words) and score < 75:
+            continue
+        results.append(name)
+    return results[:limit]
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_typo_index_keeps_fuzzy_recall(seed):
+    rng = random.Random(seed)
+    names = synthetic_names(rng, 2000)
+    snapshot = NameSnapshot((name, name) for name in names)
+    index = snapshot.prefix_index
+    all_names = [index.names[i] for i in range(len(index.names))]
+
+    found = 0
+    expected = 0
+    for _ in range(150):
+        target = rng.choice(names)
+        query = misspell(rng, target)
+        full = fuzzy_fallback(query, all_names)
+        candidates = sorted(snapshot.typo_index.candidates(query.lower()))
+        narrowed = fuzzy_fallback(query, [index.names[i] for i in candidates])
+
+        # The person the query was meant for is never lost
+        if target in full:
+            assert target in narrowed, query
+        found += len(set(full) & set(narrowed))
+        expected += len(full)
+
+    assert found / expected >= 0.98
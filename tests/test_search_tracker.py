@@ -0,0 +1,216 @@
+import threading
+
+from searchTracker import SearchTracker
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Select:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.filters = []
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        self.filters.append((column, set(values)))
+        return self
+
+    def execute(self):
+        self.client.selects.append(self.filters)
+        rows = [
+            row for row in self.client.rows.values()
+            if all(row[column] in values for column, values in self.filters)
+        ]
+        return _Response([dict(row) for row in rows])
+
+
+class _Call:
+    def __init__(self, client, function, params):
+        self.client = client
+        self.function = function
+        self.params = params
+
+    def execute(self):
+        client = self.client
+        assert self.function == "increment_connection_searches"
+        client.calls += 1
+        client.entered.set()
+        client.release.wait(5)
+        if client.failures:
+            client.failures -= 1
+            raise ConnectionError("Supabase is down")
+        # The upsert in sql/connection_searches.sql, applied atomically
+        with client.lock:
+            stored = []
+            for search in self.params["searches"]:
+                key = (search["person1"], search["person2"])
+                row = client.rows.get(key)
+                if row is None:
+                    row = client.rows[key] = dict(search)
+                else:
+                    row["count"] += search["count"]
+                    row["last_searched"] = max(row["last_searched"], search["last_searched"])
+                stored.append(dict(row))
+        return _Response(stored)
+
+
+class FakeSupabase:
+    """In-memory stand-in for the table and function SearchTracker uses."""
+
+    def __init__(self, rows=None):
+        self.rows = {}
+        for person1, person2, count in rows or []:
+            self.rows[(person1, person2)] = {
+                "person1": person1, "person2": person2, "count": count,
+                "first_searched": "2024-01-01T00:00:00", "last_searched": "2024-01-01T00:00:00"
+            }
+        self.lock = threading.Lock()
+        self.selects = []
+        self.calls = 0
+        self.failures = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def table(self, name):
+        assert name == "connection_searches"
+        return _Select(self, name)
+
+    def rpc(self, function, params):
+        return _Call(self, function, params)
+
+
+def test_record_and_flush_counts():
+    client = FakeSupabase(rows=[("Ann", "Bob", 5)])
+    tracker = SearchTracker(client)
+
+    assert tracker.record([("Bob", "Ann"), ("Ann", "Bob"), ("Cy", "Di")]) == [6, 7, 1]
+    assert client.calls == 0
+    assert tracker.flush() == 2
+    assert client.rows[("Ann", "Bob")]["count"] == 7
+    assert client.rows[("Cy", "Di")]["count"] == 1
+
+    # Stored counts are known now, so no further lookups
+    selects = len(client.selects)
+    assert tracker.record([("Di", "Cy")]) == [2]
+    assert len(client.selects) == selects
+    assert tracker.flush() == 1
+    assert client.rows[("Cy", "Di")]["count"] == 2
+    assert tracker.flush() == 0
+
+
+def test_flushes_from_several_workers_add_up():
+    client = FakeSupabase()
+    workers = [SearchTracker(client) for _ in range(3)]
+    for tracker in workers:
+        tracker.record([("Ann", "Bob")])
+    for tracker in workers:
+        tracker.flush()
+
+    assert list(client.rows) == [("Ann", "Bob")]
+    assert client.rows[("Ann", "Bob")]["count"] == 3
+
+
+def test_failed_flush_is_merged_back():
+    client = FakeSupabase()
+    tracker = SearchTracker(client)
+    tracker.record([("Ann", "Bob"), ("Ann", "Bob")])
+
+    client.failures = 1
+    assert tracker.flush() == 0
+    assert tracker.failed_flushes == 1
+    assert client.rows == {}
+
+    assert tracker.record([("Ann", "Bob")]) == [3]
+    assert tracker.stats()["pendingSearches"] == 3
+    assert tracker.flush() == 1
+    assert client.rows[("Ann", "Bob")]["count"] == 3
+    assert tracker.stats()["pending"] == 0
+
+
+def test_record_during_flush():
+    client = FakeSupabase()
+    tracker = SearchTracker(client)
+    tracker.record([("Ann", "Bob")])
+
+    client.entered.clear()
+    client.release.clear()
+    flusher = threading.Thread(target=tracker.flush)
+    flusher.start()
+    assert client.entered.wait(5)
+
+    # The search being written still counts while its flush is in flight
+    assert tracker.record([("Ann", "Bob"), ("Cy", "Di")]) == [2, 1]
+
+    client.release.set()
+    flusher.join(5)
+    assert client.rows[("Ann", "Bob")]["count"] == 1
+    assert tracker.record([("Ann", "Bob")]) == [3]
+
+    assert tracker.flush() == 2
+    assert client.rows[("Ann", "Bob")]["count"] == 3
+    assert client.rows[("Cy", "Di")]["count"] == 1
+
+
+def test_lookup_is_chunked():
+    client = FakeSupabase(rows=[("p0", "q0", 4)])
+    tracker = SearchTracker(client, select_chunk_size=2)
+
+    assert tracker.record([(f"p{i}", f"q{i}") for i in range(5)]) == [5, 1, 1, 1, 1]
+    assert len(client.selects) == 3
+    assert all(len(values) <= 2 for filters in client.selects for _, values in filters)
+
+
+def test_outage_keeps_buffer_bounded():
+    client = FakeSupabase()
+    client.failures = 1000
+    tracker = SearchTracker(client, max_pending=3, retry_backoff=60)
+
+    tracker.record([("Ann", "Bob"), ("Cy", "Di")])
+    assert tracker.flush() == 0
+    assert client.calls == 1
+
+    # Going over max_pending while backing off drops the oldest pairs, with no call on the request thread
+    for i in range(10):
+        tracker.record([(f"p{i}", f"q{i}")])
+    assert client.calls == 1
+    stats = tracker.stats()
+    assert stats["pending"] == 3
+    assert stats["droppedSearches"] == 9
+    assert set(tracker._pending) == {("p7", "q7"), ("p8", "q8"), ("p9", "q9")}
+
+    # A failed retry stays within the bound too
+    assert tracker.flush() == 0
+    assert tracker.stats()["pending"] == 3
+
+    client.failures = 0
+    assert tracker.flush() == 3
+    assert client.rows[("p9", "q9")]["count"] == 1
+
+
+def test_forced_flush_does_not_wait_for_running_flush():
+    client = FakeSupabase()
+    tracker = SearchTracker(client, max_pending=1)
+    tracker.record([("Ann", "Bob")])
+
+    client.entered.clear()
+    client.release.clear()
+    flusher = threading.Thread(target=tracker.flush)
+    flusher.start()
+    assert client.entered.wait(5)
+
+    # Over the bound, but the scheduled flush holds the lock; record returns at once
+    assert tracker.record([("Cy", "Di"), ("Ed", "Fay")]) == [1, 1]
+    assert client.calls == 1
+    assert tracker.stats()["pending"] == 1
+
+    client.release.set()
+    flusher.join(5)
+    assert tracker.flush() == 1
+    assert client.rows[("Ed", "Fay")]["count"] == 1